@@ -477,8 +477,16 @@ class FormField:
             Look at the .__doc__s of their respective methods for more details.
         customCheck:
             Pass this if checkType = customCheck.
+
+        withinCheck scans a list container on every check, so changes to it are seen.
+        Pass a membershipIndex of a large allowlist instead for hash lookups.
+        isUniqueCheck doesn't record values by default, since every .get validates.
         """
 
+        # recording would fail every read after the first
+        if checkType == "isUniqueCheck" and len(args) < 2:
+            kwargs.setdefault("record", False)
+
         # assign the callback as a method of target
         if not customCheck:
             try:
@@ -1,8 +1,196 @@
 """Callback classes"""
 
-from typing import Generator, Coroutine, Callable, Union, Tuple, List, Hashable, Dict
-from inspect import iscoroutinefunction
-import asyncio, threading
+from typing import Generator, Coroutine, Callable, Union, Tuple, List, Hashable, Dict, Any, Sequence, Iterable
+from inspect import iscoroutinefunction, ismethod
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+from time import perf_counter, monotonic
+from traceback import print_exc
+from itertools import count
+import asyncio, threading, os, atexit, pickle, weakref, heapq
+
+# the thread pool shared by ThreadCallbacks. Created on first use
+_threadPool = None
+_threadPoolSettings = {"maxWorkers" : None, "namePrefix" : "ThreadCallback"}
+_threadPoolLock = threading.Lock()
+_threadPoolLocal = threading.local()  # .inPool is set on the shared pool's threads
+
+
+def _markPoolThread():
+    """Mark the calling thread as one of the shared pool's"""
+
+    _threadPoolLocal.inPool = True
+
+
+def configureThreadPool(maxWorkers: int = None, namePrefix: str = "ThreadCallback"):
+    """Set the size and thread names of the shared thread pool.
+    An existing pool finishes its work in the background and is replaced on next use.
+
+    maxWorkers:
+        The number of threads. Defaults to ThreadPoolExecutor's default.
+    namePrefix:
+        The prefix of the thread names."""
+
+    global _threadPool
+
+    if maxWorkers is not None and maxWorkers < 1:
+        raise ValueError(f"Invalid maxWorkers ({maxWorkers})")
+
+    with _threadPoolLock:
+        _threadPoolSettings.update(maxWorkers = maxWorkers, namePrefix = namePrefix)
+        if _threadPool is not None:
+            _threadPool.shutdown(wait = False)
+            _threadPool = None
+
+
+def getThreadPool() -> ThreadPoolExecutor:
+    """Get the shared thread pool. Creates if not exists."""
+
+    global _threadPool
+
+    with _threadPoolLock:
+        if _threadPool is None:
+            _threadPool = ThreadPoolExecutor(_threadPoolSettings["maxWorkers"],
+                thread_name_prefix = _threadPoolSettings["namePrefix"], initializer = _markPoolThread)
+
+        return _threadPool
+
+
+def shutdownThreadPool(wait: bool = True, cancelPending: bool = False):
+    """Shut down the shared thread pool. A new one is created on next use.
+    Called automatically at exit.
+
+    wait:
+        Whether to wait for the submitted calls to finish.
+    cancelPending:
+        Whether to cancel the calls that haven't started."""
+
+    global _threadPool
+
+    with _threadPoolLock:
+        pool, _threadPool = _threadPool, None
+
+    if pool is not None:
+        pool.shutdown(wait = wait, cancel_futures = cancelPending)
+
+
+atexit.register(shutdownThreadPool)
+
+# the process pool shared by ProcessCallbacks. Created on first use
+_processPool = None
+_processPoolSettings = {"maxWorkers" : None}
+_processPoolLock = threading.Lock()
+
+
+def configureProcessPool(maxWorkers: int = None):
+    """Set the size of the shared process pool.
+    An existing pool finishes its work in the background and is replaced on next use.
+
+    maxWorkers:
+        The number of processes. Defaults to the number of CPUs."""
+
+    global _processPool
+
+    if maxWorkers is not None and maxWorkers < 1:
+        raise ValueError(f"Invalid maxWorkers ({maxWorkers})")
+
+    with _processPoolLock:
+        _processPoolSettings["maxWorkers"] = maxWorkers
+        if _processPool is not None:
+            _processPool.shutdown(wait = False)
+            _processPool = None
+
+
+def getProcessPool() -> ProcessPoolExecutor:
+    """Get the shared process pool. Creates if not exists."""
+
+    global _processPool
+
+    with _processPoolLock:
+        if _processPool is None:
+            _processPool = ProcessPoolExecutor(_processPoolSettings["maxWorkers"])
+
+        return _processPool
+
+
+def shutdownProcessPool(wait: bool = True, cancelPending: bool = False):
+    """Shut down the shared process pool. A new one is created on next use.
+    Called automatically at exit.
+
+    wait:
+        Whether to wait for the submitted calls to finish.
+    cancelPending:
+        Whether to cancel the calls that haven't started."""
+
+    global _processPool
+
+    with _processPoolLock:
+        pool, _processPool = _processPool, None
+
+    if pool is not None:
+        pool.shutdown(wait = wait, cancel_futures = cancelPending)
+
+
+atexit.register(shutdownProcessPool)
+
+# the event loop shared by AsyncCallbacks. Runs forever on a daemon thread once started
+_eventLoop = None
+_eventLoopThread = None
+_eventLoopLock = threading.Lock()
+
+
+def getEventLoop() -> asyncio.AbstractEventLoop:
+    """Get the shared background event loop. Starts if not running.
+    Submit coroutines to it with asyncio.run_coroutine_threadsafe."""
+
+    global _eventLoop, _eventLoopThread
+
+    with _eventLoopLock:
+        if _eventLoop is None:
+            _eventLoop = asyncio.new_event_loop()
+            _eventLoopThread = threading.Thread(target = _eventLoop.run_forever,
+                name = "AsyncCallbackLoop", daemon = True)
+            _eventLoopThread.start()
+
+        return _eventLoop
+
+
+def stopEventLoop(timeout: float = 5):
+    """Cancel the tasks on the shared event loop and stop it. A new one is started on next use.
+    Called automatically at exit.
+
+    timeout:
+        The seconds to wait for the cancelled tasks to finish."""
+
+    global _eventLoop, _eventLoopThread
+
+    with _eventLoopLock:
+        loop, thread = _eventLoop, _eventLoopThread
+        _eventLoop = _eventLoopThread = None
+
+    if loop is None:
+        return
+
+    async def cancelAll():
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+
+        if tasks:
+            await asyncio.wait(tasks, timeout = timeout)
+
+    try:
+        asyncio.run_coroutine_threadsafe(cancelAll(), loop).result(timeout + 1)
+
+    except Exception:  # stop anyway
+        pass
+
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(timeout)
+    if not thread.is_alive():
+        loop.close()
+
+
+atexit.register(stopEventLoop)
 
 class BaseCallback:
     """
@@ -23,6 +211,12 @@ class BaseCallback:
         The description of _func.
     """
 
+    # ATTRIBUTES
+    # slots as there can be thousands of callbacks
+    # __weakref__ so that they can be subscribed weakly
+    __slots__ = ("_func", "_args", "_kwargs", "_name", "_doc", "__weakref__")
+
+
     def __init__(self, func: Callable, docString: str = None, name: str = None, args = (), kwargs = {}):
         """
         ARGUMENTS
@@ -45,14 +239,9 @@ class BaseCallback:
 
 
     def __call__(self):
-        """Call _func"""
-
-        # behave normally for simple callbacks, but act as an ABC otherwise
-        if self.__class__ == BaseCallback:
-            return self._func(*self._args, **self._kwargs)
+        """Call _func. Subclasses override this."""
 
-        else:
-            raise NotImplementedError()
+        return self._func(*self._args, **self._kwargs)
 
 
     @property
@@ -73,7 +262,9 @@ class BaseCallback:
 
 class ThreadCallback(BaseCallback):
     """
-    Callbacks that spawn threads.
+    Callbacks that run on another thread.
+    They're submitted to the shared thread pool (see configureThreadPool)
+    unless they're daemons, which get their own daemon thread so that they can't hold up exiting.
     
     ATTRIBUTES
     _daemon: bool
@@ -84,27 +275,49 @@ class ThreadCallback(BaseCallback):
         The threading.Thread instance.
     """
 
-    def __init__(self, func: Callable, daemon: bool, *args, **kwargs):
+    # ATTRIBUTES
+    __slots__ = ("_daemon", "_thread")
+
+
+    def __init__(self, func: Callable, daemon: bool = False, docString: str = None, name: str = None,
+                 args = (), kwargs = {}):
         """
         ARGUMENTS
         daemon:
             Flag for whether it's a daemon thread.
         """
 
-        super().__init__(self, func, args = args, kwargs = kwargs)
+        super().__init__(func, docString, name, args, kwargs)
 
         self._daemon = daemon
+        self._thread = None
 
 
-    def __call__(self):
-        """Spawn a thread for func with args and kwargs"""
+    def __call__(self) -> Future:
+        """Run func with args and kwargs on another thread. Return its Future."""
+
+        if not self._daemon:
+            return getThreadPool().submit(self._func, *self._args, **self._kwargs)
+
+        future = Future()
+
+        def run():
+            if not future.set_running_or_notify_cancel():
+                return
+
+            try:
+                future.set_result(self._func(*self._args, **self._kwargs))
+
+            except BaseException as error:
+                future.set_exception(error)
 
-        return self.thread.run()
+        threading.Thread(target = run, daemon = True).start()
+        return future
 
 
     @property
     def thread(self) -> threading.Thread:
-        """Get self as a threading.Thread"""
+        """Get self as a threading.Thread. Not used by __call__."""
 
         if not self._thread:
             self._thread = threading.Thread(target = self._func, args = self._args,
@@ -115,47 +328,277 @@ class ThreadCallback(BaseCallback):
 
 class AsyncCallback(BaseCallback):
     """
-    Callbacks that run asynchronously.
+    Callbacks that run asynchronously on the shared background event loop (see getEventLoop).
+    Lets synchronous code such as Tk handlers run many coroutines at once.
     
     ATTRIBUTES
-    eventLoop: asyncio.AbstractEventLoop
+    eventLoop: asyncio.AbstractEventLoop property
         The event loop that coro will be executed on.
-    _coro: coroutine property
-        The coroutine made from the input func, args, and kwargs.
+    coro: coroutine property
+        A new coroutine made from the input func, args, and kwargs.
     """
 
-    def __init__(self, func: Union[Callable, Coroutine], *args, **kwargs):
+    # ATTRIBUTES
+    __slots__ = ()
+
+
+    def __init__(self, func: Union[Callable, Coroutine], docString: str = None, name: str = None,
+                 args = (), kwargs = {}):
         assert iscoroutinefunction(func)  # ensure an async function was passed
 
-        super().__init__(self, func, args = args, kwargs = kwargs)
+        super().__init__(func, docString, name, args, kwargs)
 
-        self.eventLoop = asyncio.get_event_loop()
-        self._coro = self._func(self_.args, self._kwargs)
 
+    def __call__(self) -> Future:
+        """Schedule func on the background event loop. Return its Future.
+        Don't wait for the Future on the event loop's thread or it will deadlock."""
 
-    def __call__(self):
-        """Call func now or return it as a coroutine"""
+        return asyncio.run_coroutine_threadsafe(self.coro, getEventLoop())
+
+
+    @property
+    def eventLoop(self) -> asyncio.AbstractEventLoop:
+        """Get the event loop that coro will be executed on"""
 
-        self.eventLoop.add_task(self.coro)
+        return getEventLoop()
 
 
     @property
     def coro(self) -> Coroutine:
-        """Gets func as a coroutine"""
+        """Gets func as a new coroutine. A coroutine can only be awaited once."""
 
-        return self._coro
+        return self._func(*self._args, **self._kwargs)
 
 
     @property
     def coroutine(self) -> Coroutine:  # 2nd alias for coro
-        """Gets func as a coroutine"""
+        """Gets func as a new coroutine. A coroutine can only be awaited once."""
+
+        return self.coro
+
+
+class ProcessCallback(BaseCallback):
+    """
+    Callbacks that run on the shared process pool (see configureProcessPool).
+    Escapes the GIL for CPU heavy functions.
+    func, args, and kwargs must be picklable. i.e. func is a module level function, not a lambda.
+    """
+
+    # ATTRIBUTES
+    __slots__ = ()
+
+
+    def __init__(self, func: Callable, docString: str = None, name: str = None, args = (), kwargs = {}):
+        """
+        ARGUMENTS
+        func:
+            The function to execute. Must be picklable.
+        """
+
+        super().__init__(func, docString, name, args, kwargs)
+
+        # fail now instead of when the call is sent to a process
+        try:
+            pickle.dumps((func, args, kwargs))
+
+        except (pickle.PicklingError, AttributeError, TypeError) as error:
+            raise ValueError(f"ProcessCallback needs a picklable func, args, and kwargs ({error})") from error
+
 
-        return self._coro
+    def __call__(self) -> Future:
+        """Run func with args and kwargs on another process. Return its Future."""
+
+        return getProcessPool().submit(_runCall, self._func, self._args, self._kwargs)
+
+
+    def callMany(self, argsList: Iterable[Any], chunkSize: int = 1) -> List[Future]:
+        """Run func once per args with kwargs on the process pool. Return one Future per args in order.
+
+        argsList:
+            The positional arguments of each call. A tuple, or a single argument.
+        chunkSize:
+            The number of calls sent to a process at once.
+            Bigger chunks cost less to send for quick calls but balance the work less evenly."""
+
+        if chunkSize < 1:
+            raise ValueError(f"Invalid chunkSize ({chunkSize})")
+
+        argsList = [args if isinstance(args, tuple) else (args, ) for args in argsList]
+        pool = getProcessPool()
+        futures = []
+
+        for start in range(0, len(argsList), chunkSize):
+            chunk = argsList[start:start + chunkSize]
+            chunkFutures = [Future() for _ in chunk]
+            futures += chunkFutures
+
+            def settle(chunkFuture: Future, chunkFutures: List[Future] = chunkFutures):
+                """Pass the outcome of each call in a chunk to its Future"""
+
+                if chunkFuture.cancelled() or chunkFuture.exception() is not None:
+                    for future in chunkFutures:
+                        # the caller may have cancelled it
+                        if future.done():
+                            continue
+
+                        if chunkFuture.cancelled():
+                            future.cancel()
+
+                        else:
+                            future.set_exception(chunkFuture.exception())
+
+                    return
+
+                for future, (result, error) in zip(chunkFutures, chunkFuture.result()):
+                    if future.done():
+                        continue
+
+                    if error is None:
+                        future.set_result(result)
+
+                    else:
+                        future.set_exception(error)
+
+            pool.submit(_runChunk, self._func, chunk, self._kwargs).add_done_callback(settle)
+
+        return futures
+
+
+# the ways that Callback can execute its calls
+EXECUTIONMODES = ("sequential", "thread", "async", "process")
+
+
+def _runCall(func: Callable, args: tuple, kwargs: dict) -> Any:
+    """Call func. Coroutine functions are run to completion on a new event loop."""
+
+    if iscoroutinefunction(func):
+        return asyncio.run(func(*args, **kwargs))
+
+    return func(*args, **kwargs)
+
+
+def _runChunk(func: Callable, argsList: List[tuple], kwargs: dict) -> List[tuple]:
+    """Call func once per args. Return a (result, exception) tuple per call."""
+
+    outcomes = []
+    for args in argsList:
+        try:
+            outcomes.append((_runCall(func, args, kwargs), None))
+
+        except Exception as error:
+            outcomes.append((None, error))
+
+    return outcomes
+
+
+def _execute(calls: Sequence[BaseCallback], mode: str = "sequential", timeout: float = None,
+             captureExceptions: bool = False) -> List[Any]:
+    """Execute calls and return their results in order.
+
+    mode:
+        sequential: one after another on this thread.
+        thread: all at once on a pool of threads.
+        async: all at once with asyncio.gather on the background event loop. Normal functions are run on threads.
+        process: all at once on a pool of processes. The functions and arguments must be picklable.
+    timeout:
+        The seconds each call may take, counted from when the calls start.
+        A call that runs out raises TimeoutError. It can't be stopped so it's left to finish in the background.
+        Ignored in sequential mode as the calls can't be interrupted.
+        Without one the calls run on the shared pools, otherwise on their own workers.
+        Calls made from the shared thread pool also get their own threads,
+        as waiting for the pool from inside it could leave no thread free to do the calls.
+    captureExceptions:
+        Whether to put the exception of a failing call in its place in the results.
+        Otherwise the first exception is raised after every call has finished or timed out."""
+
+    if mode not in EXECUTIONMODES:
+        raise ValueError(f"Invalid mode ({mode})")
+
+    outcomes = []  # (result, exception) tuples
+    if mode == "sequential" or not calls:
+        for call in calls:
+            try:
+                outcomes.append((call(), None))
+
+            except Exception as error:
+                outcomes.append((None, error))
+
+    elif mode == "async":
+        if threading.current_thread() is _eventLoopThread:
+            raise RuntimeError("Can't wait for the background event loop on its own thread")
+
+        # calls left running after timing out would hold up the shared pool
+        private = timeout is not None or getattr(_threadPoolLocal, "inPool", False)
+        executor = ThreadPoolExecutor(len(calls)) if private else getThreadPool()
+
+        async def guarded(call: BaseCallback) -> tuple:
+            """Await call with the timeout. Return (result, exception)."""
+
+            if iscoroutinefunction(call._func):
+                awaitable = call._func(*call._args, **call._kwargs)
+
+            else:
+                awaitable = asyncio.get_running_loop().run_in_executor(executor, _runCall,
+                    call._func, call._args, call._kwargs)
+
+            try:
+                return (await asyncio.wait_for(awaitable, timeout), None)
+
+            except Exception as error:
+                return (None, error)
+
+        async def gather() -> list:
+            return await asyncio.gather(*(guarded(call) for call in calls))
+
+        # runs on the background loop so that it works inside a running loop too
+        try:
+            outcomes = asyncio.run_coroutine_threadsafe(gather(), getEventLoop()).result()
+
+        finally:
+            if private:
+                executor.shutdown(wait = False)
+
+    else:
+        # calls left running after timing out would hold up the shared pools
+        private = timeout is not None or (mode == "thread" and getattr(_threadPoolLocal, "inPool", False))
+        if not private:
+            executor = getThreadPool() if mode == "thread" else getProcessPool()
+
+        elif mode == "thread":
+            executor = ThreadPoolExecutor(len(calls))
+
+        else:
+            executor = ProcessPoolExecutor(min(len(calls), os.cpu_count() or 1))
+
+        try:
+            futures = [executor.submit(_runCall, call._func, call._args, call._kwargs) for call in calls]
+            deadline = None if timeout is None else perf_counter() + timeout
+
+            for future in futures:
+                try:
+                    remaining = None if deadline is None else max(0, deadline - perf_counter())
+                    outcomes.append((future.result(remaining), None))
+
+                except Exception as error:
+                    outcomes.append((None, error))
+
+        finally:
+            # don't wait for calls that timed out
+            if private:
+                executor.shutdown(wait = False, cancel_futures = True)
+
+    if not captureExceptions:
+        for _, error in outcomes:
+            if error is not None:
+                raise error
+
+    return [result if error is None else error for result, error in outcomes]
 
 
 class Callback:
     """
     High level callback class. Handles converting functions, coroutines, and threads to spawn to callbacks.
+    In sequential mode thread, async, and process calls return their Futures.
     
     Trade off from performance for easy handling of callbacks and aggregating functions into 1 callback.
     When performance is more important, use the specific callback classes.
@@ -163,6 +606,12 @@ class Callback:
     ATTRIBUTES
     calls: list of callable
         The callbacks.
+    mode: str
+        How the calls are executed. One of EXECUTIONMODES.
+    timeout: float
+        The seconds each call may take. None for no limit.
+    captureExceptions: bool
+        Whether exceptions are returned in place of results instead of raised.
     __doc__: str generator property
         All the __doc__s of calls.
     names: str generator property
@@ -170,10 +619,11 @@ class Callback:
     """
 
     # ATTRIBUTES
-    calls: List[BaseCallback] = []
+    __slots__ = ("calls", "mode", "timeout", "captureExceptions")
 
 
-    def __init__(self, funcs: Dict[Callable, dict]):
+    def __init__(self, funcs: Dict[Callable, dict], mode: str = "sequential", timeout: float = None,
+                 captureExceptions: bool = False):
         """
         ARGUMENTS
         funcs:
@@ -181,11 +631,26 @@ class Callback:
             settings dict should have these keys:
                 args: the tuple of arguments for the function.
                 kwargs: the dict of keyword arguments for the function.
-                type: string stating whether it's a standard, async, or thread function.
-                    Must be within ('standard', 'async', 'thread').
+                type: string stating whether it's a standard, async, thread, or process function.
+                    Must be within ('standard', 'async', 'thread', 'process').
                 daemon: boolean stating whether it's a daemon thread.
+        mode:
+            How the calls are executed. sequential, thread, async, or process.
+            The concurrent modes take as long as the slowest call instead of the sum of them.
+        timeout:
+            The seconds each call may take in the concurrent modes. None for no limit.
+        captureExceptions:
+            Whether to return the exception of a failing call in its place instead of raising it.
         """ 
 
+        if mode not in EXECUTIONMODES:
+            raise ValueError(f"Invalid mode ({mode})")
+
+        self.calls = []
+        self.mode = mode
+        self.timeout = timeout
+        self.captureExceptions = captureExceptions
+
         def setToDefault(target: dict, key: Hashable, defaultValue: Any) -> dict:
             """
             For each key in `target`, set `value[key]` to defaultValue
@@ -206,8 +671,8 @@ class Callback:
 
         
         # ensure all keys were passed
-        for set_ in ("args", tuple(), "kwargs", dict(),
-            "daemon", False, "type", "standard"):
+        for set_ in (("args", tuple()), ("kwargs", dict()),
+            ("daemon", False), ("type", "standard")):
             funcs = setToDefault(funcs, set_[0], set_[1])
 
         # create calls
@@ -215,25 +680,27 @@ class Callback:
             # choose the callback type
             type_ = settings["type"]
             if type_ == "standard":
-                chosenType = BaseCallback
+                call = BaseCallback(func, args = settings["args"], kwargs = settings["kwargs"])
                 
             elif type_ == "async":
-                chosenType = AsyncCallback
+                call = AsyncCallback(func, args = settings["args"], kwargs = settings["kwargs"])
 
             elif type_ == "thread":
-                chosenType = ThreadCallback
+                call = ThreadCallback(func, settings["daemon"], args = settings["args"], kwargs = settings["kwargs"])
+
+            elif type_ == "process":
+                call = ProcessCallback(func, args = settings["args"], kwargs = settings["kwargs"])
 
             else:
                 raise ValueError(f"Invalid type ({type_})")
 
-            # create instance
-            self.calls.append(chosenType(func, args = settings["args"], kwargs = settings["kwargs"]))
+            self.calls.append(call)
         
 
-    def __call__(self) -> List[tuple]:
-        """Execute the callback(s) and returns their results"""
+    def __call__(self) -> List[Any]:
+        """Execute the callback(s) and returns their results in order"""
 
-        return [call() for call in self.calls]
+        return _execute(self.calls, self.mode, self.timeout, self.captureExceptions)
 
 
     @property
@@ -247,4 +714,733 @@ class Callback:
     def names(self) -> Generator[str, None, None]:
         """Generator for the _names of calls"""
 
-        return (call.name for call in self.calls)
\ No newline at end of file
+        return (call.name for call in self.calls)
+
+
+class Subscription:
+    """
+    A handler subscribed to an EventBus topic. Returned by EventBus.subscribe.
+    
+    ATTRIBUTES
+    topic: str
+        The topic pattern.
+    handler: callable property
+        The handler. None if it was weakly referenced and has been garbage collected.
+    active: bool property
+        Whether the handler is still subscribed.
+    _handler: callable or weakref
+        The handler or a weak reference to it.
+    _weak: bool
+        Whether _handler is a weak reference.
+    _bus: EventBus
+        The bus that it's subscribed to. None once unsubscribed.
+    _order: int
+        When it subscribed, for dispatching in subscription order.
+    """
+
+    # ATTRIBUTES
+    __slots__ = ("topic", "_handler", "_weak", "_bus", "_order", "__weakref__")
+    _counter = count()
+
+
+    def __init__(self, bus: 'EventBus', topic: str, handler: Callable, weak: bool = False):
+        self.topic = topic
+        self._bus = bus
+        self._weak = weak
+        self._order = next(Subscription._counter)
+
+        if not weak:
+            self._handler = handler
+
+        else:
+            # unsubscribe once the handler is garbage collected
+            # the subscription is referenced weakly so that the handler's weakref doesn't keep it alive
+            selfRef = weakref.ref(self)
+            def onCollected(_, selfRef = selfRef):
+                subscription = selfRef()
+                if subscription is not None:
+                    subscription.unsubscribe()
+
+            refType = weakref.WeakMethod if ismethod(handler) else weakref.ref
+            self._handler = refType(handler, onCollected)
+
+
+    @property
+    def handler(self) -> Union[Callable, None]:
+        """Get the handler. None if it was garbage collected."""
+
+        return self._handler() if self._weak else self._handler
+
+
+    @property
+    def active(self) -> bool:
+        """Check if the handler is still subscribed"""
+
+        return self._bus is not None
+
+
+    def unsubscribe(self):
+        """Stop receiving events. Does nothing if already unsubscribed."""
+
+        bus = self._bus
+        if bus is not None:
+            bus.unsubscribe(self)
+
+
+class _TopicNode:
+    """
+    A node of the EventBus topic trie. Each level is one dot separated segment.
+    
+    ATTRIBUTES
+    children: str : _TopicNode dict
+        The next segments. "*" and "#" are the wildcards.
+    subscriptions: Subscription : None dict
+        The subscriptions of the topic that ends here. A dict to keep their order.
+    """
+
+    # ATTRIBUTES
+    __slots__ = ("children", "subscriptions")
+
+
+    def __init__(self):
+        self.children = {}
+        self.subscriptions = {}
+
+
+class EventBus:
+    """
+    Dispatches published events to the handlers subscribed to their topic.
+    Topics are dot separated. e.g. user.created
+    Subscriptions can use wildcards:
+        *: exactly one segment. user.* matches user.created but not user.created.admin
+        #: zero or more segments. user.# matches user, user.created, and user.created.admin
+    Subscriptions are held in a trie so publishing only visits the branches that match,
+    and the matches of each topic are cached until the subscriptions change.
+    
+    ATTRIBUTES
+    mode: str
+        How the handlers are executed. One of EXECUTIONMODES.
+    timeout: float
+        The seconds each handler may take in the concurrent modes. None for no limit.
+    captureExceptions: bool
+        Whether exceptions are returned in place of results instead of raised.
+    cacheSize: int
+        The number of topics whose matches are cached.
+    _root: _TopicNode
+        The root of the topic trie.
+    _matches: str : list dict
+        The cached subscriptions of each published topic.
+    _lock: threading.RLock
+        Lock for the trie and cache.
+    """
+
+    # ATTRIBUTES
+    __slots__ = ("mode", "timeout", "captureExceptions", "cacheSize", "_root", "_matches", "_lock")
+
+
+    def __init__(self, mode: str = "sequential", timeout: float = None, captureExceptions: bool = False,
+                 cacheSize: int = 1024):
+        """
+        ARGUMENTS
+        mode:
+            How the handlers are executed. sequential, thread, async, or process.
+        timeout:
+            The seconds each handler may take in the concurrent modes. None for no limit.
+        captureExceptions:
+            Whether to return the exception of a failing handler in its place instead of raising it.
+        cacheSize:
+            The number of topics whose matches are cached.
+        """
+
+        if mode not in EXECUTIONMODES:
+            raise ValueError(f"Invalid mode ({mode})")
+
+        self.mode = mode
+        self.timeout = timeout
+        self.captureExceptions = captureExceptions
+        self.cacheSize = cacheSize
+        self._root = _TopicNode()
+        self._matches = {}
+        self._lock = threading.RLock()
+
+
+    @staticmethod
+    def _segments(topic: str) -> List[str]:
+        """Split a topic into its segments"""
+
+        segments = topic.split(".")
+        if not all(segments):
+            raise ValueError(f"Invalid topic ({topic})")
+
+        return segments
+
+
+    def subscribe(self, topic: str, handler: Callable, weak: bool = False) -> Subscription:
+        """Call handler with the arguments of every event published to topic.
+
+        topic:
+            The topic pattern. May contain the * and # wildcards.
+        handler:
+            The function to call. Coroutine functions are run on the background event loop.
+        weak:
+            Whether to reference handler weakly so that subscribing doesn't keep it alive.
+            It's unsubscribed once garbage collected. Use for bound methods of short lived objects."""
+
+        if not callable(handler):
+            raise TypeError(f"handler must be callable ({handler!r})")
+
+        segments = self._segments(topic)
+        subscription = Subscription(self, topic, handler, weak)
+
+        with self._lock:
+            node = self._root
+            for segment in segments:
+                node = node.children.setdefault(segment, _TopicNode())
+
+            node.subscriptions[subscription] = None
+            self._matches.clear()
+
+        return subscription
+
+
+    def unsubscribe(self, subscription: Subscription):
+        """Stop calling the handler of subscription. Does nothing if already unsubscribed."""
+
+        with self._lock:
+            if subscription._bus is not self:
+                return
+
+            subscription._bus = None
+            self._matches.clear()
+
+            # find the node and remove the branches left empty
+            segments = self._segments(subscription.topic)
+            path = [self._root]
+            for segment in segments:
+                path.append(path[-1].children[segment])
+
+            path[-1].subscriptions.pop(subscription, None)
+            for index in range(len(segments), 0, -1):
+                node = path[index]
+                if node.children or node.subscriptions:
+                    break
+
+                del path[index - 1].children[segments[index - 1]]
+
+
+    def subscribers(self, topic: str) -> List[Subscription]:
+        """Get the subscriptions that match topic in the order they subscribed"""
+
+        with self._lock:
+            matches = self._matches.get(topic)
+            if matches is not None:
+                return matches
+
+            segments = self._segments(topic)
+            if "*" in segments or "#" in segments:
+                raise ValueError(f"Can't publish to a wildcard topic ({topic})")
+
+            found = set()
+            self._collect(self._root, segments, 0, found)
+
+            # the trie order groups by pattern, so restore the subscription order
+            matches = sorted(found, key = lambda subscription: subscription._order)
+            if len(self._matches) >= self.cacheSize:
+                self._matches.clear()
+
+            self._matches[topic] = matches
+            return matches
+
+
+    def _collect(self, node: _TopicNode, segments: List[str], index: int, found: set):
+        """Add the subscriptions of the nodes under node that match segments[index:] to found"""
+
+        children = node.children
+        multi = children.get("#")
+        if multi is not None:
+            # zero or more segments
+            for end in range(index, len(segments) + 1):
+                self._collect(multi, segments, end, found)
+
+        if index == len(segments):
+            found.update(node.subscriptions)
+            return
+
+        for key in (segments[index], "*"):
+            child = children.get(key)
+            if child is not None:
+                self._collect(child, segments, index + 1, found)
+
+
+    def publish(self, topic: str, *args, **kwargs) -> List[Any]:
+        """Call the handlers subscribed to topic with args and kwargs.
+        Return their results in the order they subscribed."""
+
+        calls = []
+        for subscription in self.subscribers(topic):
+            handler = subscription.handler
+            if handler is None:  # collected but not unsubscribed yet
+                continue
+
+            if iscoroutinefunction(handler):
+                calls.append(AsyncCallback(handler, args = args, kwargs = kwargs))
+
+            else:
+                calls.append(BaseCallback(handler, args = args, kwargs = kwargs))
+
+        return _execute(calls, self.mode, self.timeout, self.captureExceptions)
+
+
+class Timer:
+    """
+    A call scheduled on a Scheduler. Returned by Scheduler.callLater and Scheduler.callEvery.
+    
+    ATTRIBUTES
+    when: float
+        The time.monotonic() time of the next call.
+    interval: float
+        The seconds between calls. None if it's only called once.
+    cancelled: bool
+        Whether it was cancelled.
+    _queued: bool
+        Whether it's in the scheduler's heap.
+    _func: callable
+        The function to call.
+    _args: tuple
+        The positional arguments for _func.
+    _kwargs: dict
+        The keyword arguments for _func.
+    _scheduler: Scheduler
+        The scheduler that it's on.
+    """
+
+    # ATTRIBUTES
+    __slots__ = ("when", "interval", "cancelled", "_queued", "_func", "_args", "_kwargs", "_scheduler")
+
+
+    def __init__(self, scheduler: 'Scheduler', when: float, interval: Union[float, None],
+                 func: Callable, args: tuple, kwargs: dict):
+        self.when = when
+        self.interval = interval
+        self.cancelled = False
+        self._queued = False
+        self._func = func
+        self._args = args
+        self._kwargs = kwargs
+        self._scheduler = scheduler
+
+
+    def cancel(self):
+        """Stop the call from happening. Does nothing if already called or cancelled."""
+
+        self._scheduler.cancel(self)
+
+
+def _callLaterWithTimer(scheduler: 'Scheduler', delay: float, fire: Callable) -> Timer:
+    """Call fire with its own Timer after delay seconds, so that it can tell if it's been replaced.
+    The caller must hold the lock that fire takes so that the Timer is known before fire runs."""
+
+    timers = []
+    timer = scheduler.callLater(delay, lambda: fire(timers[0]))
+    timers.append(timer)
+    return timer
+
+
+class Debouncer:
+    """
+    Calls func once calls to it have stopped for delay seconds, with the arguments of the last call.
+    Returned by Scheduler.debounce. e.g. searching once typing has paused.
+    
+    ATTRIBUTES
+    delay: float
+        The seconds without calls before func is called.
+    _func: callable
+        The function to call.
+    _call: tuple
+        The (args, kwargs) of the last call.
+    _last: float
+        The time.monotonic() time of the last call.
+    _timer: Timer
+        The pending call. None if there isn't one.
+    _scheduler: Scheduler
+        The scheduler that it's on.
+    _lock: threading.Lock
+        Lock for the pending call.
+    """
+
+    # ATTRIBUTES
+    __slots__ = ("delay", "_func", "_call", "_last", "_timer", "_scheduler", "_lock")
+
+
+    def __init__(self, scheduler: 'Scheduler', delay: float, func: Callable):
+        self.delay = delay
+        self._func = func
+        self._call = None
+        self._last = 0
+        self._timer = None
+        self._scheduler = scheduler
+        self._lock = threading.Lock()
+
+
+    def __call__(self, *args, **kwargs):
+        """Restart the delay with these arguments"""
+
+        with self._lock:
+            self._call = (args, kwargs)
+            self._last = monotonic()
+
+            # the pending timer moves itself back when it fires instead of being replaced every call
+            if self._timer is None:
+                self._timer = _callLaterWithTimer(self._scheduler, self.delay, self._fire)
+
+
+    def _fire(self, timer: Timer):
+        """Call func if the delay has passed, otherwise wait for the rest of it"""
+
+        with self._lock:
+            # cancelled after the scheduler took it, and maybe replaced by a later call
+            if timer is not self._timer or self._call is None:
+                return
+
+            remaining = self._last + self.delay - monotonic()
+            if remaining > 0:
+                self._timer = _callLaterWithTimer(self._scheduler, remaining, self._fire)
+                return
+
+            args, kwargs = self._call
+            self._timer = self._call = None
+
+        self._func(*args, **kwargs)
+
+
+    def cancel(self):
+        """Drop the pending call"""
+
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+
+            self._timer = self._call = None
+
+
+class Throttler:
+    """
+    Calls func at most once per interval seconds. Returned by Scheduler.throttle.
+    The first call goes through straight away and calls during the interval are dropped,
+    except for the last one when trailing, which is called once the interval is over.
+    e.g. handling a flood of resize events.
+    
+    ATTRIBUTES
+    interval: float
+        The minimum seconds between calls of func.
+    trailing: bool
+        Whether the last call during the interval is called once it's over.
+    _func: callable
+        The function to call.
+    _call: tuple
+        The (args, kwargs) of the last dropped call. None if there isn't one.
+    _next: float
+        The time.monotonic() time that func can next be called.
+    _timer: Timer
+        The pending trailing call. None if there isn't one.
+    _scheduler: Scheduler
+        The scheduler that it's on.
+    _lock: threading.Lock
+        Lock for the pending call.
+    """
+
+    # ATTRIBUTES
+    __slots__ = ("interval", "trailing", "_func", "_call", "_next", "_timer", "_scheduler", "_lock")
+
+
+    def __init__(self, scheduler: 'Scheduler', interval: float, func: Callable, trailing: bool = True):
+        self.interval = interval
+        self.trailing = trailing
+        self._func = func
+        self._call = None
+        self._next = 0
+        self._timer = None
+        self._scheduler = scheduler
+        self._lock = threading.Lock()
+
+
+    def __call__(self, *args, **kwargs):
+        """Call func on the scheduler now if the interval has passed, otherwise maybe later"""
+
+        with self._lock:
+            now = monotonic()
+            if now >= self._next and self._timer is None:
+                self._next = now + self.interval
+                self._scheduler.callLater(0, self._func, *args, **kwargs)
+
+            elif self.trailing:
+                self._call = (args, kwargs)
+                if self._timer is None:
+                    self._timer = _callLaterWithTimer(self._scheduler, self._next - now, self._fire)
+
+
+    def _fire(self, timer: Timer):
+        """Call func with the last dropped call"""
+
+        with self._lock:
+            # cancelled after the scheduler took it, and maybe replaced by a later call
+            if timer is not self._timer:
+                return
+
+            self._timer = None
+            if self._call is None:
+                return
+
+            args, kwargs = self._call
+            self._call = None
+            self._next = monotonic() + self.interval
+
+        self._func(*args, **kwargs)
+
+
+    def cancel(self):
+        """Drop the pending trailing call"""
+
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+
+            self._timer = self._call = None
+
+
+class Scheduler:
+    """
+    Runs delayed and periodic calls from one background thread.
+    Timers are kept in a heap so any number of them only needs the one thread.
+    Cancelled timers are left in the heap and skipped when they come up,
+    unless they're over half of it, when it's rebuilt without them.
+    
+    ATTRIBUTES
+    useThreadPool: bool
+        Whether calls are submitted to the shared thread pool (see configureThreadPool)
+        so that a slow call doesn't hold up the others. Otherwise they run on the scheduler's thread.
+    onError: callable
+        Called with the exception when a call fails. Prints the traceback by default.
+    _heap: list of (when, sequence, Timer) tuples
+        The pending timers. Tuples so that the heap compares them in C.
+    _sequence: itertools.count
+        Orders timers that are due at the same time.
+    _cancelledCount: int
+        The number of cancelled timers in _heap.
+    _lock: threading.Lock
+        Lock for the heap. Used directly where nothing waits as it's quicker than the condition.
+    _condition: threading.Condition
+        Wakes the thread when an earlier timer is added or it's stopped. Uses _lock.
+    _thread: threading.Thread
+        The scheduler's thread. Started on first use. None once stopped.
+    """
+
+    def __init__(self, useThreadPool: bool = False, onError: Callable[[Exception], Any] = None):
+        """
+        ARGUMENTS
+        useThreadPool:
+            Whether to submit calls to the shared thread pool instead of running them on the scheduler's thread.
+        onError:
+            Called with the exception when a call fails. Prints the traceback by default.
+        """
+
+        self.useThreadPool = useThreadPool
+        self.onError = onError
+        self._heap = []
+        self._sequence = count()
+        self._cancelledCount = 0
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+        self._thread = None
+
+
+    def _schedule(self, delay: float, interval: Union[float, None], func: Callable, args: tuple, kwargs: dict) -> Timer:
+        """Add a timer and start the thread if not running"""
+
+        if delay < 0:
+            raise ValueError(f"Invalid delay ({delay})")
+
+        timer = Timer(self, monotonic() + delay, interval, func, args, kwargs)
+        with self._lock:
+            heapq.heappush(self._heap, (timer.when, next(self._sequence), timer))
+            timer._queued = True
+
+            if self._thread is None:
+                self._thread = threading.Thread(target = self._run, name = "Scheduler", daemon = True)
+                self._thread.start()
+
+            # only wake the thread if it has to wait less
+            elif self._heap[0][2] is timer:
+                self._condition.notify()
+
+        return timer
+
+
+    def callLater(self, delay: float, func: Callable, *args, **kwargs) -> Timer:
+        """Call func with args and kwargs after delay seconds. Return its Timer."""
+
+        return self._schedule(delay, None, func, args, kwargs)
+
+
+    def callEvery(self, interval: float, func: Callable, *args, initialDelay: float = None, **kwargs) -> Timer:
+        """Call func with args and kwargs every interval seconds until cancelled. Return its Timer.
+        Calls that fall behind are skipped rather than run in a burst.
+
+        initialDelay:
+            The seconds before the first call. Defaults to interval."""
+
+        if interval <= 0:
+            raise ValueError(f"Invalid interval ({interval})")
+
+        return self._schedule(interval if initialDelay is None else initialDelay, interval, func, args, kwargs)
+
+
+    def debounce(self, delay: float, func: Callable) -> Debouncer:
+        """Get a callable that calls func once it hasn't been called for delay seconds"""
+
+        return Debouncer(self, delay, func)
+
+
+    def throttle(self, interval: float, func: Callable, trailing: bool = True) -> Throttler:
+        """Get a callable that calls func at most once every interval seconds"""
+
+        return Throttler(self, interval, func, trailing)
+
+
+    def cancel(self, timer: Timer):
+        """Stop timer's call from happening. Does nothing if already called or cancelled."""
+
+        with self._lock:
+            if timer.cancelled:
+                return
+
+            timer.cancelled = True
+            if timer._queued:
+                self._cancelledCount += 1
+
+            # rebuild when it's mostly dead timers
+            if self._cancelledCount > len(self._heap) // 2:
+                for _, _, queued in self._heap:
+                    queued._queued = not queued.cancelled
+
+                self._heap = [entry for entry in self._heap if not entry[2].cancelled]
+                heapq.heapify(self._heap)
+                self._cancelledCount = 0
+
+
+    def __len__(self) -> int:
+        """Get the number of pending timers"""
+
+        with self._lock:
+            return len(self._heap) - self._cancelledCount
+
+
+    def _run(self):
+        """Call the timers as they come due until stopped"""
+
+        current = threading.current_thread()
+        while True:
+            with self._condition:
+                while True:
+                    # stopped or replaced by a new thread
+                    if self._thread is not current:
+                        return
+
+                    heap = self._heap
+                    if not heap:
+                        self._condition.wait()
+                        continue
+
+                    timer = heap[0][2]
+                    if timer.cancelled:
+                        heapq.heappop(heap)
+                        timer._queued = False
+                        self._cancelledCount -= 1
+                        continue
+
+                    delay = timer.when - monotonic()
+                    if delay > 0:
+                        self._condition.wait(delay)
+                        continue
+
+                    # due
+                    if timer.interval is None:
+                        heapq.heappop(heap)
+                        timer._queued = False
+
+                    else:
+                        # the next slot that's still in the future
+                        now = monotonic()
+                        timer.when += timer.interval
+                        if timer.when <= now:
+                            timer.when += ((now - timer.when) // timer.interval + 1) * timer.interval
+
+                        heapq.heapreplace(heap, (timer.when, next(self._sequence), timer))
+
+                    break
+
+            if self.useThreadPool:
+                getThreadPool().submit(self._call, timer)
+
+            else:
+                self._call(timer)
+
+
+    def _call(self, timer: Timer):
+        """Call a timer's function and pass any exception to onError"""
+
+        try:
+            timer._func(*timer._args, **timer._kwargs)
+
+        except Exception as error:
+            if self.onError is not None:
+                self.onError(error)
+
+            else:
+                print_exc()
+
+
+    def stop(self, wait: bool = True):
+        """Stop the thread and drop the pending timers. The thread is started again on next use.
+
+        wait:
+            Whether to wait for the call in progress to finish."""
+
+        with self._condition:
+            for _, _, timer in self._heap:
+                timer._queued = False
+
+            self._heap = []
+            self._cancelledCount = 0
+            thread, self._thread = self._thread, None
+            self._condition.notify()
+
+        if wait and thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+
+# the scheduler shared by everything that doesn't need its own
+_scheduler = None
+_schedulerLock = threading.Lock()
+
+
+def getScheduler() -> Scheduler:
+    """Get the shared Scheduler. Creates if not exists."""
+
+    global _scheduler
+
+    with _schedulerLock:
+        if _scheduler is None:
+            _scheduler = Scheduler()
+
+        return _scheduler
+
+
+def _stopScheduler():
+    """Stop the shared Scheduler at exit"""
+
+    if _scheduler is not None:
+        _scheduler.stop(wait = False)
+
+
+atexit.register(_stopScheduler)
\ No newline at end of file
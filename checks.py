@@ -1,6 +1,23 @@
 """Validation checks"""
 
-from typing import Iterable, Any, Container
+from bisect import bisect_left
+from collections import namedtuple, deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from hashlib import blake2b
+from itertools import chain, count, islice
+from math import ceil, log
+from numbers import Complex, Integral, Real
+import os
+import re
+import sqlite3 as sql
+from typing import Iterable, Any, Container, Callable, Dict, List, Sequence, Tuple, Union
+
+# numpy is only needed for the array checks
+try:
+    import numpy as np
+
+except ModuleNotFoundError:
+    np = None
 
 # old version of CHECKTYPES, left for backwards compatibility
 def validateInput(input: str)->bool:
@@ -46,7 +63,17 @@ def lengthCheck(value: Any, minLength: int = None, maxLength: int = None) -> boo
 
 def withinCheck(value: Any, toCheck: Container) -> bool:
     """Check that the value exists in iterable.
-    Use lambda: not withinCheck(value, toCheck) to get the inverse."""
+    Use lambda: not withinCheck(value, toCheck) to get the inverse.
+    Pass a membershipIndex when checking against the same large container repeatedly.
+    Large tuples are indexed automatically."""
+
+    # tuples can't change, so their index can be reused
+    if type(toCheck) is tuple and len(toCheck) >= _TUPLE_INDEX_MIN_LENGTH:
+        try:
+            return (value in _tupleIndex(toCheck))
+
+        except TypeError:  # the value can't be hashed or compared with the indexed values
+            pass
 
     return (value in toCheck)
 
@@ -62,6 +89,25 @@ def typeCheck(value: Any, targetType: type, subclassCheck: bool = False) -> bool
         return (type(value) is targetType)
 
 
+def rangeCheck(value: Any, minimum: Any = None, maximum: Any = None) -> bool:
+    """Check that minimum <= value <= maximum.
+    Leave minimum or maximum as None if there is no boundary."""
+
+    return ((minimum is None or minimum <= value) and (maximum is None or value <= maximum))
+
+
+def isUniqueCheck(value: Any, tracker: Union['UniqueTracker', 'TableUniqueTracker'], record: bool = True) -> bool:
+    """Check that the value hasn't been seen by tracker.
+    record:
+        Whether to remember the value so that it fails next time.
+        Use False to check without recording. e.g. a form field that is validated on every keystroke."""
+
+    if record:
+        return tracker.add(value)
+
+    return (value not in tracker)
+
+
 def defaultCheck(*args, **kwargs):  # absorb any args
     """No check currently but this was added for maintainability."""
 
@@ -74,5 +120,1012 @@ CHECKTYPES = {
     "lengthCheck" : lengthCheck,
     "withinCheck" : withinCheck,
     "typeCheck" : typeCheck,
+    "rangeCheck" : rangeCheck,
+    "isUniqueCheck" : isUniqueCheck,
     "defaultCheck" : defaultCheck,
-    }
\ No newline at end of file
+    }
+
+
+# MEMBERSHIP INDEXES
+class SortedIndex:
+    """
+    Membership index for orderable values that can't be hashed.
+    Lookups are binary searches, so the values must be totally ordered.
+
+    ATTRIBUTES
+    values: list
+        The sorted values.
+    """
+
+    def __init__(self, values: Iterable):
+        """
+        ARGUMENTS
+        values:
+            The values to index. Must be orderable.
+        """
+
+        self.values = sorted(values)
+
+
+    def __contains__(self, value: Any) -> bool:
+        try:
+            index = bisect_left(self.values, value)
+
+        except TypeError:  # can't be ordered with the values, so scan
+            return value in self.values
+
+        return index < len(self.values) and self.values[index] == value
+
+
+    def __iter__(self):
+        return iter(self.values)
+
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+    def containsRange(self, minimum: Any, maximum: Any) -> bool:
+        """Check if any value is within minimum <= value <= maximum"""
+
+        index = bisect_left(self.values, minimum)
+        return index < len(self.values) and self.values[index] <= maximum
+
+
+class BloomFilter:
+    """
+    Compact membership index for huge sets of values.
+    Values that were added are always found, but values that weren't
+    are wrongly found at a rate of about falsePositiveRate.
+    Values are hashed by their repr, so 1 and 1.0 are different.
+
+    ATTRIBUTES
+    size: int
+        The number of bits.
+    hashCount: int
+        The number of bits set per value.
+    count: int
+        The number of values added.
+    _bits: bytearray
+        The bits.
+    """
+
+    def __init__(self, expected: int, falsePositiveRate: float = 0.01):
+        """
+        ARGUMENTS
+        expected:
+            The number of values that will be added.
+            Adding more raises the false positive rate.
+        falsePositiveRate:
+            The chance of finding a value that wasn't added.
+        """
+
+        expected = max(expected, 1)
+        self.size = max(8, ceil(-expected * log(falsePositiveRate) / (log(2) ** 2)))
+        self.hashCount = max(1, round(self.size / expected * log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+
+    @classmethod
+    def fromIterable(cls, values: Iterable, falsePositiveRate: float = 0.01) -> 'BloomFilter':
+        """Create a filter sized for values and add them"""
+
+        values = values if hasattr(values, "__len__") else list(values)
+        bloom = cls(len(values), falsePositiveRate)
+        bloom.update(values)
+        return bloom
+
+
+    def _positions(self, value: Any) -> Iterable[int]:
+        """Get the bits of value. Double hashing gives hashCount positions from one digest."""
+
+        digest = blake2b(repr(value).encode(), digest_size = 16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        size = self.size
+        return [(first + i * second) % size for i in range(self.hashCount)]
+
+
+    def add(self, value: Any):
+        """Add a value"""
+
+        bits = self._bits
+        for position in self._positions(value):
+            bits[position >> 3] |= 1 << (position & 7)
+
+        self.count += 1
+
+
+    def checkAndAdd(self, value: Any) -> bool:
+        """Add a value. Return whether it may have been added before.
+        Hashes once instead of twice for `in` then add."""
+
+        bits = self._bits
+        found = True
+        for position in self._positions(value):
+            mask = 1 << (position & 7)
+            if not bits[position >> 3] & mask:
+                found = False
+                bits[position >> 3] |= mask
+
+        if not found:
+            self.count += 1
+
+        return found
+
+
+    def update(self, values: Iterable):
+        """Add every value"""
+
+        for value in values:
+            self.add(value)
+
+
+    def __contains__(self, value: Any) -> bool:
+        bits = self._bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+    def __len__(self) -> int:
+        return self.count
+
+
+def membershipIndex(values: Iterable, kind: str = "auto", falsePositiveRate: float = 0.01) -> Container:
+    """Build a container for fast repeated withinCheck lookups.
+    The index is a snapshot, so later changes to values aren't seen.
+
+    kind:
+        auto: set if the values are hashable, otherwise a tuple that's scanned.
+        set: frozenset. Constant time lookups.
+        sorted: SortedIndex. Logarithmic time lookups for unhashable values.
+            They must be totally ordered, so not e.g. sets, whose < is subset.
+        bloom: BloomFilter. Constant time and a fraction of the memory,
+            but values that weren't passed are sometimes found.
+    falsePositiveRate:
+        The false positive rate of a bloom index."""
+
+    if kind not in ("auto", "set", "sorted", "bloom"):
+        raise ValueError(f"Invalid kind ({kind})")
+
+    # already an index
+    if isinstance(values, (frozenset, SortedIndex, BloomFilter)) and kind == "auto":
+        return values
+
+    if kind == "bloom":
+        return BloomFilter.fromIterable(values, falsePositiveRate)
+
+    if kind == "sorted":
+        return SortedIndex(values)
+
+    values = values if isinstance(values, (list, tuple)) else list(values)
+    try:
+        return frozenset(values)
+
+    except TypeError:  # unhashable values
+        if kind == "set":
+            raise
+
+        # a binary search misses values that are only partially ordered
+        return tuple(values)
+
+
+# tuples shorter than this are scanned faster than they're indexed
+_TUPLE_INDEX_MIN_LENGTH = 16
+_TUPLE_INDEX_CACHE_SIZE = 64
+
+# id : (tuple, index) dict. The tuple is kept so that its id isn't reused
+_tupleIndexes = {}
+
+
+def _tupleIndex(toCheck: tuple) -> Container:
+    """Get the cached index of a tuple. Builds if not exists."""
+
+    cached = _tupleIndexes.get(id(toCheck))
+    if cached is not None and cached[0] is toCheck:
+        return cached[1]
+
+    # unhashable values are scanned
+    index = membershipIndex(toCheck)
+
+    # forget the oldest
+    if len(_tupleIndexes) >= _TUPLE_INDEX_CACHE_SIZE:
+        _tupleIndexes.pop(next(iter(_tupleIndexes)), None)
+
+    _tupleIndexes[id(toCheck)] = (toCheck, index)
+    return index
+
+
+# UNIQUENESS
+def _canonicalKey(value: Any) -> str:
+    """Get a string that's the same for values that are equal, unlike their repr.
+    e.g. 1 and 1.0, or frozensets in any order.
+    Raise TypeError for types that have no such string."""
+
+    if value is None or isinstance(value, (str, bytes)):
+        return repr(value)
+
+    # like hash, numbers that are equal get the same key
+    if isinstance(value, Integral):
+        return repr(int(value))
+
+    if isinstance(value, Real):
+        value = float(value)
+        return repr(int(value)) if value.is_integer() else repr(value)
+
+    if isinstance(value, Complex):
+        value = complex(value)
+        return _canonicalKey(value.real) if value.imag == 0 else repr(value)
+
+    if isinstance(value, tuple):
+        return "(" + ", ".join(map(_canonicalKey, value)) + ",)"
+
+    if isinstance(value, frozenset):
+        return "frozenset({" + ", ".join(sorted(map(_canonicalKey, value))) + "})"
+
+    raise TypeError(f"{type(value).__name__} values have no canonical key. Pass UniqueTracker a key function")
+
+
+class UniqueTracker:
+    """
+    Remembers the values it has seen so that duplicates can be found.
+    Small streams are tracked with a set. Once there are more than exactLimit values
+    they move to a bloom filter in front of a temporary on-disk database,
+    so memory stays bounded however many values are tracked.
+    A value is only looked up in the database when the bloom filter may have seen it,
+    which is about falsePositiveRate of the new values plus every duplicate.
+    Values are compared by equality while they're in the set.
+    Once moved, they're compared by a string key that's the same for equal values,
+    which exists for None, bools, numbers, strings, bytes, and tuples and frozensets of them.
+    Pass key for other values. It's then used instead of the values in both places.
+
+    ATTRIBUTES
+    exactLimit: int
+        The number of values that are kept in a set.
+    expected: int
+        The number of values the bloom filter is sized for.
+    falsePositiveRate: float
+        The false positive rate of the bloom filter.
+    bufferSize: int
+        The number of new values that are written to the database at once.
+    count: int
+        The number of unique values seen.
+    key: callable
+        Gets the str that identifies a value. None to use the values themselves.
+    _seen: set
+        The values while there are at most exactLimit. None once moved.
+    _bloom: BloomFilter
+        The filter of the moved values' keys.
+    _store: sqlite3.Connection
+        The database of the moved values' keys.
+    _pending: set
+        The keys that haven't been written to the database yet.
+    """
+
+    def __init__(self, exactLimit: int = 100000, expected: int = 10000000,
+                 falsePositiveRate: float = 0.01, bufferSize: int = 10000, key: Callable = None):
+        """
+        ARGUMENTS
+        exactLimit:
+            The number of values to keep in a set before moving to the bloom filter and database.
+        expected:
+            The number of unique values the bloom filter is sized for.
+            Going over makes database lookups more frequent but results stay exact.
+        falsePositiveRate:
+            The false positive rate of the bloom filter.
+        bufferSize:
+            The number of new values to write to the database at once.
+        key:
+            Gets a str that's the same for equal values and different otherwise.
+            Needed for values that aren't None, bools, numbers, strings, bytes, or tuples and frozensets of them.
+        """
+
+        if exactLimit < 0:
+            raise ValueError(f"Invalid exactLimit ({exactLimit})")
+
+        self.exactLimit = exactLimit
+        self.expected = max(expected, exactLimit)
+        self.falsePositiveRate = falsePositiveRate
+        self.bufferSize = bufferSize
+        self.count = 0
+        self.key = key
+        self._seen = set()
+        self._bloom = None
+        self._store = None
+        self._pending = set()
+
+
+    @property
+    def spilled(self) -> bool:
+        """Whether the values have moved to the bloom filter and database"""
+
+        return self._seen is None
+
+
+    def _spill(self):
+        """Move the values from the set to the bloom filter and database"""
+
+        # first, so that values without a key leave the set as it was
+        keys = list(self._seen) if self.key is not None else [_canonicalKey(value) for value in self._seen]
+
+        self._bloom = BloomFilter(self.expected, self.falsePositiveRate)
+
+        # an empty name is a private database on disk, deleted when closed
+        self._store = sql.connect("")
+        self._store.execute("PRAGMA journal_mode = OFF")
+        self._store.execute("PRAGMA synchronous = OFF")
+        self._store.execute("CREATE TABLE seen (key TEXT PRIMARY KEY) WITHOUT ROWID")
+
+        self._bloom.update(keys)
+        self._store.executemany("INSERT OR IGNORE INTO seen VALUES (?)", ((key,) for key in keys))
+        self._seen = None
+
+
+    def _flush(self):
+        """Write the pending keys to the database"""
+
+        self._store.executemany("INSERT OR IGNORE INTO seen VALUES (?)", ((key,) for key in self._pending))
+        self._pending.clear()
+
+
+    def _stored(self, key: str) -> bool:
+        """Check if key was seen once moved"""
+
+        if key not in self._bloom:  # never added
+            return False
+
+        if key in self._pending:
+            return True
+
+        return self._store.execute("SELECT 1 FROM seen WHERE key = ?", (key,)).fetchone() is not None
+
+
+    def add(self, value: Any) -> bool:
+        """Remember value. Return whether it's new."""
+
+        # equal values get the same key, so results don't change when moving
+        key = self.key(value) if self.key is not None else value
+        if self._seen is not None:
+            if key in self._seen:
+                return False
+
+            self._seen.add(key)
+            self.count += 1
+            if self.count > self.exactLimit:
+                self._spill()
+
+            return True
+
+        if self.key is None:
+            key = _canonicalKey(value)
+
+        # only keys the filter may have seen need confirming
+        if self._bloom.checkAndAdd(key):
+            if key in self._pending or self._store.execute("SELECT 1 FROM seen WHERE key = ?", (key,)).fetchone():
+                return False
+
+        self._pending.add(key)
+        self.count += 1
+        if len(self._pending) >= self.bufferSize:
+            self._flush()
+
+        return True
+
+
+    def unique(self, values: Iterable) -> Iterable:
+        """Yield the values that haven't been seen and remember them"""
+
+        add = self.add
+        return (value for value in values if add(value))
+
+
+    def __contains__(self, value: Any) -> bool:
+        key = self.key(value) if self.key is not None else value
+        if self._seen is not None:
+            return key in self._seen
+
+        return self._stored(key if self.key is not None else _canonicalKey(value))
+
+
+    def __len__(self) -> int:
+        return self.count
+
+
+    def clear(self):
+        """Forget every value"""
+
+        self.close()
+        self.count = 0
+        self._seen = set()
+
+
+    def close(self):
+        """Delete the database"""
+
+        if self._store is not None:
+            self._store.close()
+
+        self._store = None
+        self._bloom = None
+        self._pending.clear()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+
+class TableUniqueTracker:
+    """
+    Checks values against a column of a DBWriter table as well as the values it has seen.
+    The column must have a unique index so that each lookup is a seek instead of a scan.
+
+    ATTRIBUTES
+    db: DBWriter
+        The database. Anything with a DBWriter style doQuery works.
+    table: str
+        The table name.
+    column: str
+        The column name.
+    tracker: UniqueTracker
+        The values seen that may not be in the table yet.
+    _query: str
+        The query to check if a value exists.
+    """
+
+    # ATTRIBUTES
+    _IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+    def __init__(self, db: Any, table: str, column: str, tracker: UniqueTracker = None):
+        """
+        ARGUMENTS
+        db:
+            The database. Anything with a DBWriter style doQuery works.
+        table:
+            The table name.
+        column:
+            The column name. Must have a unique index.
+        tracker:
+            The tracker for the values seen. A new UniqueTracker by default.
+        """
+
+        for name in (table, column):
+            if not self._IDENTIFIER.match(name):
+                raise ValueError(f"Invalid identifier ({name})")
+
+        self.db = db
+        self.table = table
+        self.column = column
+        self.tracker = tracker if tracker is not None else UniqueTracker()
+
+        if not self._isIndexed():
+            raise ValueError(f"{table}.{column} has no unique index")
+
+        self._query = f'SELECT 1 FROM "{table}" WHERE "{column}" = ? LIMIT 1'
+
+
+    def _isIndexed(self) -> bool:
+        """Check if the column has a single column unique index or is the integer primary key"""
+
+        for index in self.db.doQuery(f'PRAGMA index_list("{self.table}")'):
+            # (seq, name, unique, origin, partial)
+            if not index[2] or (len(index) > 4 and index[4]):  # partial indexes don't cover every row
+                continue
+
+            columns = self.db.doQuery(f'PRAGMA index_info("{index[1]}")')
+            if len(columns) == 1 and columns[0][2] == self.column:
+                return True
+
+        # (cid, name, type, notnull, default, pk)
+        info = self.db.doQuery(f'PRAGMA table_info("{self.table}")')
+        keys = [column for column in info if column[5]]
+        return (len(keys) == 1 and keys[0][1] == self.column and keys[0][2].upper() == "INTEGER")
+
+
+    def inTable(self, value: Any) -> bool:
+        """Check if value is in the table"""
+
+        return bool(self.db.doQuery(self._query, (value,)))
+
+
+    def add(self, value: Any) -> bool:
+        """Remember value. Return whether it's new to both the table and the tracker."""
+
+        if self.inTable(value):
+            return False
+
+        return self.tracker.add(value)
+
+
+    def __contains__(self, value: Any) -> bool:
+        return value in self.tracker or self.inTable(value)
+
+
+    def close(self):
+        """Close the tracker. The database is left open."""
+
+        self.tracker.close()
+
+
+# SCHEMAS
+ValidationFailure = namedtuple("ValidationFailure", "index field check value")
+
+
+class Schema:
+    """
+    Validates records (dicts or sequences) field by field.
+    The checks are compiled into one specialized function the first time it's needed,
+    so validating many records doesn't look up CHECKTYPES or call a closure per value.
+
+    ATTRIBUTES
+    fields: field : list dict
+        The checks of each field. Format: field : [check, ...]
+        A field is a key, a dotted path of keys for nested dicts, or an index.
+        A check is one of:
+            "checkName"
+            ("checkName", kwargs dict)
+            ("checkName", args tuple, kwargs dict)
+            a callable that takes the value and returns a bool (a custom check)
+    source: str
+        The source code of the compiled functions.
+    _validateOne: callable
+        The compiled function for one record. Returns [(field, check, value), ...]
+    _validateMany: callable
+        The compiled function for many records. Returns [ValidationFailure, ...]
+    """
+
+    def __init__(self, fields: Dict[Union[str, int], List[Any]]):
+        """
+        ARGUMENTS
+        fields:
+            The checks of each field. See the ATTRIBUTES section.
+        """
+
+        self.fields = {field : list(checks) for field, checks in fields.items()}
+        self.source = None
+        self._validateOne = None
+        self._validateMany = None
+
+
+    def __getstate__(self) -> dict:
+        # the compiled functions can't be pickled. They're compiled again on first use
+        return {"fields" : self.fields}
+
+
+    def __setstate__(self, state: dict):
+        self.__init__(state["fields"])
+
+
+    @staticmethod
+    def _parseCheck(check: Any) -> tuple:
+        """Get the (name, func, args, kwargs) of a check in any of the accepted forms"""
+
+        if callable(check):
+            return (getattr(check, "__name__", "customCheck"), check, (), {})
+
+        if isinstance(check, str):
+            check = (check, )
+
+        name, *rest = check
+        args, kwargs = (), {}
+        if len(rest) == 1:
+            kwargs = rest[0]
+
+        elif len(rest) == 2:
+            args, kwargs = rest
+
+        elif rest:
+            raise ValueError(f"Invalid check ({check})")
+
+        try:
+            return (name, CHECKTYPES[name], tuple(args), dict(kwargs))
+
+        except KeyError:  # provide better error if invalid checkType
+            raise ValueError(f"Invalid checkType ({name})")
+
+
+    def compile(self) -> Callable:
+        """Generate and compile the validation functions. Return the one for a single record.
+        Called automatically on first use. Call again after changing fields."""
+
+        namespace = {"ValidationFailure" : ValidationFailure}
+        compiled = []  # (field, access, [(test, name), ...]) tuples
+
+        def constant(value: Any) -> str:
+            """Store a value in the namespace of the generated code. Return its name."""
+
+            name = f"c{len(namespace)}"
+            namespace[name] = value
+            return name
+
+        for field, checks in self.fields.items():
+            # nested keys are separated by dots
+            path = field.split(".") if isinstance(field, str) else [field]
+            access = "record" + "".join(f"[{key!r}]" for key in path)
+            tests = []
+
+            for check in checks:
+                name, func, args, kwargs = self._parseCheck(check)
+
+                # inline the built in checks
+                if func is lengthCheck and not args and set(kwargs) <= {"minLength", "maxLength"}:
+                    minLength, maxLength = kwargs.get("minLength"), kwargs.get("maxLength")
+                    assert (minLength or maxLength)
+
+                    if minLength and maxLength:
+                        test = f"{minLength!r} <= len(value) <= {maxLength!r}"
+
+                    elif minLength:
+                        test = f"{minLength!r} <= len(value)"
+
+                    else:
+                        test = f"len(value) <= {maxLength!r}"
+
+                elif func is withinCheck and len(args) + len(kwargs) == 1:
+                    toCheck = args[0] if args else kwargs["toCheck"]
+
+                    # tuples can't change, so they're indexed once. Lists are left live
+                    if type(toCheck) is tuple:
+                        toCheck = membershipIndex(toCheck)
+
+                    test = f"value in {constant(toCheck)}"
+
+                elif func is typeCheck and len(args) + len(kwargs) <= 2 and set(kwargs) <= {"targetType", "subclassCheck"}:
+                    targetType = args[0] if args else kwargs["targetType"]
+                    subclassCheck = args[1] if len(args) > 1 else kwargs.get("subclassCheck", False)
+
+                    if subclassCheck:
+                        test = f"isinstance(value, {constant(targetType)})"
+
+                    else:
+                        test = f"type(value) is {constant(targetType)}"
+
+                elif func is defaultCheck:
+                    continue
+
+                else:
+                    call = constant(func)
+                    arguments = "".join(f", {constant(arg)}" for arg in args)
+                    arguments += "".join(f", {key}={constant(arg)}" for key, arg in kwargs.items())
+                    test = f"{call}(value{arguments})"
+
+                tests.append((test, name))
+
+            compiled.append((repr(field), access, tests))
+
+        def body(fail: str, indent: str) -> List[str]:
+            """Get the lines that check one record.
+            fail is formatted with the field, check, and value of each failure."""
+
+            lines = []
+            for field, access, tests in compiled:
+                lines += ["try:",
+                    f"    value = {access}",
+                    "except (KeyError, IndexError, TypeError):",
+                    "    " + fail.format(field = field, check = "'missing'", value = "None"),
+                    "else:"]
+
+                # a check that raises has failed
+                for test, name in tests:
+                    lines += ["    try:",
+                        f"        passed = {test}",
+                        "    except Exception:",
+                        "        passed = False",
+                        "    if not passed:",
+                        "        " + fail.format(field = field, check = repr(name), value = "value")]
+
+                if not tests:
+                    lines.append("    pass")
+
+            return [indent + line for line in lines]
+
+        # the loop is generated too so that there's no function call per record
+        source = ["def validateOne(record):",
+            "    failures = []"]
+        source += body("failures.append(({field}, {check}, {value}))", "    ")
+        source += ["    return failures",
+            "",
+            "def validateMany(records, failFast = False):",
+            "    failures = []",
+            "    for index, record in enumerate(records):",
+            "        count = len(failures)"]
+        source += body("failures.append(ValidationFailure(index, {field}, {check}, {value}))", "        ")
+        source += ["        if failFast and len(failures) > count:",
+            "            break",
+            "    return failures"]
+
+        self.source = "\n".join(source)
+        exec(compile(self.source, "<Schema>", "exec"), namespace)
+        self._validateOne = namespace["validateOne"]
+        self._validateMany = namespace["validateMany"]
+        return self._validateOne
+
+
+    def validate(self, record: Any) -> List[ValidationFailure]:
+        """Check one record. Return its failures."""
+
+        if self._validateOne is None:
+            self.compile()
+
+        return [ValidationFailure(None, *failure) for failure in self._validateOne(record)]
+
+
+    def isValid(self, record: Any) -> bool:
+        """Check if one record passes every check"""
+
+        if self._validateOne is None:
+            self.compile()
+
+        return not self._validateOne(record)
+
+
+    def validateMany(self, records: Iterable[Any], failFast: bool = False) -> List[ValidationFailure]:
+        """Check every record. Return the failures in input order.
+        index is the position of the failing record in records.
+
+        failFast:
+            Whether to stop after the first record that fails."""
+
+        if self._validateMany is None:
+            self.compile()
+
+        return self._validateMany(records, failFast)
+
+
+# the schema of each validateParallel worker process
+_workerSchema = None
+
+
+def _initWorker(schema: Schema):
+    """Set the schema of a worker process so that it isn't sent with every chunk"""
+
+    global _workerSchema
+    _workerSchema = schema
+    schema.compile()
+
+
+def _validateChunk(start: int, records: List[Any], failFast: bool) -> List[ValidationFailure]:
+    """Check a chunk of records in a worker process. Return the failures indexed from start."""
+
+    return [failure._replace(index = failure.index + start) for failure in _workerSchema.validateMany(records, failFast)]
+
+
+def _hasTracker(schema: Schema) -> bool:
+    """Check if any of schema's checks remembers values, which a worker process would only do for its own chunks"""
+
+    for checks in schema.fields.values():
+        for check in checks:
+            name, func, args, kwargs = Schema._parseCheck(check)
+            if func is isUniqueCheck or any(isinstance(arg, (UniqueTracker, TableUniqueTracker))
+                                            for arg in chain(args, kwargs.values())):
+                return True
+
+    return False
+
+
+def validateParallel(records: Iterable[Any], schema: Schema, processes: int = None, chunkSize: int = 1000,
+                     ordered: bool = True, failFast: bool = False) -> List[ValidationFailure]:
+    """Check every record with schema across a pool of processes. Return the failures.
+    index is the position of the failing record in records.
+    Worth it when there are many records or the checks are CPU heavy.
+    Custom checks must be picklable. i.e. module level functions, not lambdas.
+    Each worker has its own copy of the checks, so they can't remember values across records.
+    Schemas with isUniqueCheck raise ValueError. Use Schema.validateMany for them.
+
+    processes:
+        The number of worker processes. Defaults to the number of CPUs.
+    chunkSize:
+        The number of records sent to a worker at once.
+        Bigger chunks cost less to send but balance the work less evenly.
+    ordered:
+        Whether to return the failures in input order.
+        Otherwise they're returned as each chunk finishes.
+    failFast:
+        Whether to stop after a record fails.
+        When ordered it's the first failing record, otherwise it's the first one found."""
+
+    if chunkSize < 1:
+        raise ValueError(f"Invalid chunkSize ({chunkSize})")
+
+    if _hasTracker(schema):
+        raise ValueError("Can't check uniqueness in parallel, as each worker would only see its own records")
+
+    records = iter(records)
+    chunks = ((start, chunk) for start, chunk in zip(count(0, chunkSize),
+        iter(lambda: list(islice(records, chunkSize)), [])))
+
+    # not worth starting processes for one chunk
+    first = next(chunks, None)
+    if first is None:
+        return []
+
+    second = next(chunks, None)
+    if second is None or processes == 1:
+        failures = []
+        for start, chunk in chain((first,) if second is None else (first, second), chunks):
+            failures += [failure._replace(index = failure.index + start) for failure in schema.validateMany(chunk, failFast)]
+            if failFast and failures:
+                break
+
+        return failures
+
+    processes = processes or os.cpu_count() or 1
+    chunks = chain((first, second), chunks)
+    failures = []
+
+    executor = ProcessPoolExecutor(processes, initializer = _initWorker, initargs = (schema,))
+    try:
+        # a few chunks per process are in flight so that the records aren't all read at once
+        inFlight = deque()
+        for start, chunk in islice(chunks, processes * 2):
+            inFlight.append(executor.submit(_validateChunk, start, chunk, failFast))
+
+        while inFlight:
+            if ordered:
+                done = (inFlight.popleft(), )
+
+            else:
+                done, _ = wait(inFlight, return_when = FIRST_COMPLETED)
+                for future in done:
+                    inFlight.remove(future)
+
+            for future in done:
+                chunkFailures = future.result()
+                failures += chunkFailures
+
+                # each chunk stops at its first failing record
+                if failFast and chunkFailures:
+                    return failures
+
+                # replace the finished chunk
+                for start, chunk in islice(chunks, 1):
+                    inFlight.append(executor.submit(_validateChunk, start, chunk, failFast))
+
+        return failures
+
+    finally:
+        executor.shutdown(wait = True, cancel_futures = True)
+
+
+# ARRAY CHECKS
+# each returns (mask, failingIndices) where mask[i] is whether values[i] passed
+# they use NumPy when it's installed and fall back to the scalar checks otherwise
+
+# the NumPy type families that match the builtin types
+_DTYPE_FAMILIES = {
+    bool : "bool_",
+    int : "integer",
+    float : "floating",
+    complex : "complexfloating",
+    str : "str_",
+    bytes : "bytes_",
+    }
+
+
+def _arrayResult(mask: Any) -> Tuple[Any, Any]:
+    """Get the (mask, failingIndices) of a boolean mask"""
+
+    if np is None:
+        return (mask, [index for index, passed in enumerate(mask) if not passed])
+
+    return (mask, np.flatnonzero(~mask))
+
+
+def _sameTypeArray(values: Iterable) -> Any:
+    """Convert values to an array. Return None if NumPy would have to change some of their types,
+    e.g. a mix of numbers and strings becomes all strings, or if they aren't scalars."""
+
+    if isinstance(values, np.ndarray):
+        return None if values.dtype == object or values.ndim != 1 else values
+
+    values = values if isinstance(values, (list, tuple)) else list(values)
+    try:
+        array = np.asarray(values)
+
+    except ValueError:  # ragged
+        return None
+
+    if array.dtype == object or array.ndim != 1:
+        return None
+
+    if array.dtype.kind == "U" and not all(isinstance(value, str) for value in values):
+        return None
+
+    if array.dtype.kind == "S" and not all(isinstance(value, bytes) for value in values):
+        return None
+
+    return array
+
+
+def arrayLengthCheck(values: Sequence, minLength: int = None, maxLength: int = None) -> Tuple[Any, Any]:
+    """lengthCheck for every element of values"""
+
+    # ensure at least one boundary was passed
+    assert (minLength or maxLength)
+
+    if np is None:
+        return _arrayResult([lengthCheck(value, minLength, maxLength) for value in values])
+
+    # asarray would fail on ragged lists, so only string arrays are measured by NumPy
+    if isinstance(values, np.ndarray) and values.dtype.kind in "US":
+        lengths = np.char.str_len(values)
+
+    else:
+        lengths = np.fromiter(map(len, values), dtype = np.intp, count = len(values))
+
+    mask = np.ones(len(lengths), dtype = bool)
+    if minLength:
+        mask &= lengths >= minLength
+
+    if maxLength:
+        mask &= lengths <= maxLength
+
+    return _arrayResult(mask)
+
+
+def arrayWithinCheck(values: Sequence, toCheck: Container) -> Tuple[Any, Any]:
+    """withinCheck for every element of values"""
+
+    # bloom filters can only be asked about one value at a time, and strings find substrings
+    if np is not None and not isinstance(toCheck, (BloomFilter, str, bytes)):
+        # np.isin needs arrays whose values kept their types
+        array = _sameTypeArray(values)
+        allowed = None if array is None else _sameTypeArray(toCheck)
+        if allowed is not None:
+            return _arrayResult(np.isin(array, allowed))
+
+    mask = [withinCheck(value, toCheck) for value in values]
+    return _arrayResult(mask if np is None else np.array(mask, dtype = bool))
+
+
+def arrayRangeCheck(values: Sequence, minimum: Any = None, maximum: Any = None) -> Tuple[Any, Any]:
+    """rangeCheck for every element of values"""
+
+    if np is None:
+        return _arrayResult([rangeCheck(value, minimum, maximum) for value in values])
+
+    values = np.asarray(values)
+    mask = np.ones(len(values), dtype = bool)
+    if minimum is not None:
+        mask &= values >= minimum
+
+    if maximum is not None:
+        mask &= values <= maximum
+
+    return _arrayResult(mask)
+
+
+def arrayTypeCheck(values: Sequence, targetType: type, subclassCheck: bool = False) -> Tuple[Any, Any]:
+    """typeCheck for every element of values.
+    Typed arrays are checked once by their dtype, with builtin types matching
+    their NumPy family (e.g. int matches every integer dtype).
+    Other sequences are checked element by element."""
+
+    if np is None:
+        return _arrayResult([typeCheck(value, targetType, subclassCheck) for value in values])
+
+    if isinstance(values, np.ndarray) and values.dtype != object:
+        family = getattr(np, _DTYPE_FAMILIES[targetType]) if targetType in _DTYPE_FAMILIES else targetType
+        passed = np.issubdtype(values.dtype, family)
+        return _arrayResult(np.full(len(values), passed, dtype = bool))
+
+    if subclassCheck:
+        mask = np.fromiter((isinstance(value, targetType) for value in values), dtype = bool, count = len(values))
+
+    else:
+        mask = np.fromiter((type(value) is targetType for value in values), dtype = bool, count = len(values))
+
+    return _arrayResult(mask)
+
+
+# the array versions of CHECKTYPES
+ARRAYCHECKTYPES = {
+    "lengthCheck" : arrayLengthCheck,
+    "withinCheck" : arrayWithinCheck,
+    "typeCheck" : arrayTypeCheck,
+    "rangeCheck" : arrayRangeCheck,
+    }
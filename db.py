@@ -1,113 +1,2503 @@
 """A class for handling databases."""
 
-import sqlite3 as sql, os
-from typing import Any, List
+import sqlite3 as sql, os, re, sys, threading, atexit, logging, tempfile, csv, json, heapq, zlib, asyncio
+from collections import namedtuple, deque, OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from queue import Queue, Empty
+from functools import lru_cache
+from itertools import chain, islice
+from operator import itemgetter
+from logging import getLogger
+from logging.handlers import RotatingFileHandler
+from numbers import Integral, Real
+from time import perf_counter
+from typing import Any, AsyncIterator, Callable, Dict, FrozenSet, Hashable, Iterable, Iterator, List, \
+    Sequence, Set, Tuple, Union
+from urllib.request import pathname2url
 from .decorators import retry
 
+_READ_START = re.compile(r"\s*(SELECT|EXPLAIN|VALUES|WITH)\b", re.IGNORECASE)
+_WRITE_WORD = re.compile(r"\b(INSERT|UPDATE|DELETE|REPLACE)\b", re.IGNORECASE)
+
+@lru_cache(maxsize = 1024)
+def _isRead(query: str) -> bool:
+    """Check if a query only reads, so a read-only connection can run it"""
+
+    match = _READ_START.match(query)
+    if not match:
+        return False
+
+    # common table expressions can lead into a write
+    return match.group(1).upper() != "WITH" or not _WRITE_WORD.search(query)
+
+
+_READ_TABLE = re.compile(r"\b(?:FROM|JOIN)\s+[\"`\[]?(\w+)", re.IGNORECASE)
+_WRITE_TABLE = re.compile(r"\b(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO|UPDATE(?:\s+OR\s+\w+)?"
+    r"|DELETE\s+FROM)\s+(?:[\"`\[]?\w+[\"`\]]?\s*\.\s*)?[\"`\[]?(\w+)", re.IGNORECASE)
+_SCHEMA_CHANGE = re.compile(r"\s*(CREATE|DROP|ALTER)\b", re.IGNORECASE)
+
+# statements that would end or escape IndexAdvisor's replay transaction
+_UNREPLAYABLE = re.compile(r"\s*(BEGIN|COMMIT|END|ROLLBACK|SAVEPOINT|RELEASE|PRAGMA|VACUUM|ATTACH|DETACH)\b",
+    re.IGNORECASE)
+
+@lru_cache(maxsize = 1024)
+def _readTables(query: str) -> FrozenSet[str]:
+    """Get the lowercase names of the tables and views that a read uses"""
+
+    return frozenset(table.lower() for table in _READ_TABLE.findall(query))
+
+
+@lru_cache(maxsize = 1024)
+def _writtenTables(query: str) -> FrozenSet[str]:
+    """Get the lowercase names of the tables that a write changes.
+    Return None if they can't be found."""
+
+    tables = _WRITE_TABLE.findall(query)
+    return frozenset(table.lower() for table in tables) if tables else None
+
+
+def _tableCollector(tables: set) -> Callable:
+    """Get an authorizer that adds the lowercase name of every table and view read to tables"""
+
+    def authorize(action: int, arg1: str, arg2: str, database: str, source: str) -> int:
+        if action == sql.SQLITE_READ and arg1 is not None:
+            tables.add(arg1.lower())
+
+        return sql.SQLITE_OK
+
+    return authorize
+
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?:e[+-]?\d+)?\b", re.IGNORECASE)
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+@lru_cache(maxsize = 1024)
+def normalizeQuery(query: str) -> str:
+    """Reduce a query to its shape so that queries which only differ by
+    literals, the length of IN (...) lists, or whitespace are grouped together."""
+
+    query = _STRING_LITERAL.sub("?", query)
+    query = _NUMBER_LITERAL.sub("?", query)
+    query = _PLACEHOLDER_LIST.sub("(?, ...)", query)
+    return _WHITESPACE.sub(" ", query).strip().rstrip(";")
+
+
+# text that SQLite's numeric affinities convert. Python's int and float also take 1_000, nan, and inf
+_NUMERIC_TEXT = re.compile(r"\s*[+-]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?\s*", re.ASCII)
+_INTEGER_TEXT = re.compile(r"\s*[+-]?\d+\s*", re.ASCII)
+
+def _toNumber(value: Any) -> Any:
+    """Convert value to an int or float if it looks like one, like SQLite's NUMERIC affinity"""
+
+    if not isinstance(value, str) or not _NUMERIC_TEXT.fullmatch(value):
+        return value
+
+    if _INTEGER_TEXT.fullmatch(value):
+        number = int(value)
+
+        # too big for SQLite's 64 bit integers
+        if -2 ** 63 <= number < 2 ** 63:
+            return number
+
+    return float(value)
+
+
+def _toReal(value: Any) -> Any:
+    """Convert value to a float if it looks like a number, like SQLite's REAL affinity"""
+
+    if not isinstance(value, str) or not _NUMERIC_TEXT.fullmatch(value):
+        return value
+
+    return float(value)
+
+
+def _toBindable(value: Any) -> Any:
+    """Convert the JSON values that sqlite3 can't store as they are.
+    Objects and arrays become JSON text and booleans become 1 or 0."""
+
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+
+    if isinstance(value, bool):
+        return int(value)
+
+    return value
+
+
+def _affinityCoercer(declaredType: str, emptyIsNull: bool = True) -> Callable:
+    """Get the function that converts imported values to a column's type.
+    Follows SQLite's rules for turning a declared type into an affinity.
+
+    emptyIsNull:
+        Whether empty strings become NULL. CSV has no other way to write NULL but JSON does.
+        JSON objects, arrays, and booleans are converted by _toBindable when it's off."""
+
+    declaredType = declaredType.upper()
+    if "INT" in declaredType:
+        convert = _toNumber
+
+    elif any(name in declaredType for name in ("CHAR", "CLOB", "TEXT")):
+        convert = str
+
+    elif not declaredType or "BLOB" in declaredType:
+        convert = None
+
+    elif any(name in declaredType for name in ("REAL", "FLOA", "DOUB")):
+        convert = _toReal
+
+    else:
+        convert = _toNumber
+
+    if convert is None:
+        if not emptyIsNull:
+            return _toBindable
+
+        return lambda value: None if value == "" else value
+
+    if not emptyIsNull:
+        return lambda value: None if value is None else convert(_toBindable(value))
+
+    # empty CSV fields are NULLs
+    return lambda value: None if value is None or value == "" else convert(value)
+
+
+def _jsonDefault(value: Any) -> Any:
+    """Make the values that json can't serialize serializable"""
+
+    if isinstance(value, (bytes, memoryview)):
+        return bytes(value).hex()
+
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+@lru_cache(maxsize = 128)
+def _namedRow(columns: Tuple[str]) -> type:
+    """Get a namedtuple class for a result's column names"""
+
+    # column names like count(*) aren't valid field names
+    return namedtuple("Row", columns, rename = True)
+
+
+class ConnectionPool:
+    """
+    Hands out sqlite3 connections to one database.
+    Connections are either checked out with .acquire()/.connection()
+    or held per thread with .threadConnection().
+
+    ATTRIBUTES
+    database: str
+        The path (or URI) passed to sqlite3.connect.
+    maxSize: int
+        The maximum number of open connections.
+    timeout: float
+        The default number of seconds to wait for a free connection
+        before raising TimeoutError. None waits forever.
+    uri: bool
+        Whether database is a URI.
+    pragmas: dict
+        The PRAGMAs run once on each new connection. Format: name : value
+    reclaimInterval: float
+        The seconds between looking for dead threads while waiting.
+    stats: dict property
+        The wait and usage metrics.
+    _idle: list of sqlite3.Connection
+        The connections that aren't checked out.
+    _owners: threading.Thread : sqlite3.Connection dict
+        The thread-local connections and their threads.
+    _local: threading.local
+        Holds the connection of each thread.
+    _condition: threading.Condition
+        Guards the pool state and wakes up waiting threads.
+    _size: int
+        The number of open connections.
+    _closed: bool
+        Whether .close() has been called.
+    _version: int
+        Incremented whenever pragmas is changed by .setPragma().
+    _versions: sqlite3.Connection : int dict
+        The _version that each connection's PRAGMAs were last run at.
+    """
+
+    # ATTRIBUTES
+    reclaimInterval: float = 0.05  # seconds between looking for dead threads while waiting
+
+
+    def __init__(self, database: str, maxSize: int = 5, timeout: float = 30.0,
+        uri: bool = False, pragmas: Dict[str, Any] = None):
+        """
+        ARGUMENTS
+        database:
+            The path (or URI) of the database.
+        maxSize:
+            The maximum number of open connections.
+        timeout:
+            The default number of seconds to wait for a free connection
+            before raising TimeoutError. None waits forever.
+        uri:
+            Whether database is a URI.
+        pragmas:
+            The PRAGMAs to run on each new connection. Format: name : value
+        """
+
+        if maxSize < 1:
+            raise ValueError("maxSize must be at least 1")
+
+        self.database = database
+        self.maxSize = maxSize
+        self.timeout = timeout
+        self.uri = uri
+        self.pragmas = dict(pragmas or {})
+
+        self._idle = []
+        self._owners = {}
+        self._local = threading.local()
+        self._condition = threading.Condition()
+        self._size = 0
+        self._closed = False
+        self._version = 0
+        self._versions = {}
+
+        # metrics
+        self._checkouts = 0
+        self._waits = 0
+        self._waitTime = 0.0
+        self._maxWait = 0.0
+        self._reclaimed = 0
+
+
+    @retry(logMsg = "Failed to create connection.")
+    def _connect(self) -> sql.Connection:
+        """Open a new connection and run the PRAGMAs on it"""
+
+        # connections move between threads when they're returned to the pool
+        connection = sql.connect(self.database, uri = self.uri, check_same_thread = False)
+        self._applyPragmas(connection)
+        return connection
+
+
+    def _applyPragmas(self, connection: sql.Connection):
+        """Run pragmas on connection and mark it as up to date"""
+
+        version = self._version
+        for name, value in self.pragmas.items():
+            connection.execute(f"PRAGMA {name} = {value};")
+
+        self._versions[connection] = version
+
+
+    def setPragma(self, name: str, value: Any):
+        """Add or change a PRAGMA for every connection.
+        New connections run it when they're opened, existing ones
+        the next time they're handed out outside of a transaction."""
+
+        with self._condition:
+            self.pragmas[name] = value
+            self._version += 1
+
+        # bring the calling thread's connection up to date now
+        connection = getattr(self._local, "connection", None)
+        if connection is not None and not connection.in_transaction:
+            self._applyPragmas(connection)
+
+
+    def acquire(self, timeout: float = None) -> sql.Connection:
+        """Check out a connection. Wait for one to be released if the pool is full.
+        Raise TimeoutError if none is free within timeout (defaults to self.timeout)."""
+
+        if timeout is None:
+            timeout = self.timeout
+
+        start = perf_counter()
+        waited = False
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise sql.ProgrammingError("Cannot operate on a closed ConnectionPool")
+
+                if self._idle:
+                    connection = self._idle.pop()
+                    break
+
+                # reserve a slot then open the connection outside of the lock
+                if self._size < self.maxSize:
+                    self._size += 1
+                    connection = None
+                    break
+
+                # threads that died while holding a connection can't release it
+                if self._reclaimDead():
+                    continue
+
+                waited = True
+                remaining = None
+                if timeout is not None:
+                    remaining = timeout - (perf_counter() - start)
+                    if remaining <= 0:
+                        self._recordWait(perf_counter() - start)
+                        raise TimeoutError(f"No free connection to {self.database} after {timeout}s")
+
+                # dying threads don't notify, so wake up to look for them
+                if self._owners:
+                    remaining = min(remaining or self.reclaimInterval, self.reclaimInterval)
+
+                self._condition.wait(remaining)
+
+            self._checkouts += 1
+            if waited:
+                self._recordWait(perf_counter() - start)
+
+        if connection is None:
+            connection = self._connect()
+
+            # retry returns None when every attempt failed
+            if connection is None:
+                with self._condition:
+                    self._size -= 1
+                    self._condition.notify()
+
+                raise sql.OperationalError(f"Unable to connect to {self.database}")
+
+        elif self._versions.get(connection) != self._version:
+            self._applyPragmas(connection)
+
+        return connection
+
+
+    def release(self, connection: sql.Connection):
+        """Return a checked out connection to the pool.
+        Uncommitted changes are rolled back."""
+
+        if connection.in_transaction:
+            connection.rollback()
+
+        with self._condition:
+            if self._closed:
+                connection.close()
+                self._versions.pop(connection, None)
+                self._size -= 1
+
+            else:
+                self._idle.append(connection)
+
+            self._condition.notify()
+
+
+    @contextmanager
+    def connection(self, timeout: float = None) -> Iterator[sql.Connection]:
+        """Check out a connection for the duration of a with block"""
+
+        connection = self.acquire(timeout)
+        try:
+            yield connection
+
+        finally:
+            self.release(connection)
+
+
+    def threadConnection(self, create: bool = True) -> sql.Connection:
+        """Get the calling thread's connection. Checks one out on first use
+        unless create is False, in which case None is returned.
+        The connection is held until .releaseThread() is called or the thread dies."""
+
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            if not create:
+                return None
+
+            connection = self.acquire()
+            self._local.connection = connection
+            with self._condition:
+                self._owners[threading.current_thread()] = connection
+
+        # PRAGMAs can't always be changed mid-transaction
+        elif self._versions.get(connection) != self._version and not connection.in_transaction:
+            self._applyPragmas(connection)
+
+        return connection
+
+
+    def releaseThread(self):
+        """Return the calling thread's connection to the pool"""
+
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            return
+
+        self._local.connection = None
+        with self._condition:
+            self._owners.pop(threading.current_thread(), None)
+
+        self.release(connection)
+
+
+    def _reclaimDead(self) -> bool:
+        """Move the connections of dead threads back to _idle.
+        Must be called while holding _condition. Return whether any were reclaimed."""
+
+        dead = [thread for thread in self._owners if not thread.is_alive()]
+        for thread in dead:
+            connection = self._owners.pop(thread)
+            if connection.in_transaction:
+                connection.rollback()
+
+            self._idle.append(connection)
+            self._reclaimed += 1
+
+        return bool(dead)
+
+
+    def _recordWait(self, duration: float):
+        """Add a wait to the metrics. Must be called while holding _condition."""
+
+        self._waits += 1
+        self._waitTime += duration
+        self._maxWait = max(self._maxWait, duration)
+
+
+    def close(self):
+        """Close the idle and thread-held connections.
+        Checked out connections are closed when they're released."""
+
+        with self._condition:
+            self._closed = True
+            toClose = self._idle + list(self._owners.values())
+            self._size -= len(toClose)
+            self._idle = []
+            self._owners = {}
+            self._versions = {}
+            self._condition.notify_all()
+
+        for connection in toClose:
+            connection.close()
+
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        """Get the wait and usage metrics"""
+
+        with self._condition:
+            return {
+                "size" : self._size,
+                "maxSize" : self.maxSize,
+                "idle" : len(self._idle),
+                "inUse" : self._size - len(self._idle),
+                "threadHeld" : len(self._owners),
+                "checkouts" : self._checkouts,
+                "waits" : self._waits,
+                "totalWait" : self._waitTime,
+                "averageWait" : self._waitTime / self._waits if self._waits else 0.0,
+                "maxWait" : self._maxWait,
+                "reclaimed" : self._reclaimed,
+                }
+
+
+class _PeriodicTask:
+    """
+    Runs ._task() every interval seconds on a background thread.
+    Subclasses must override ._task().
+
+    ATTRIBUTES
+    interval: float
+        The number of seconds between runs.
+    running: bool property
+        Whether the background thread is alive.
+    _stopEvent: threading.Event
+        Set to stop the background thread.
+    _thread: threading.Thread
+        The background thread.
+    """
+
+    def __init__(self, interval: float):
+        """
+        ARGUMENTS
+        interval:
+            The number of seconds between runs.
+        """
+
+        self.interval = interval
+        self._stopEvent = threading.Event()
+        self._thread = None
+
+
+    def start(self):
+        """Start running every interval seconds"""
+
+        if self.running:
+            return
+
+        self._stopEvent.clear()
+        self._thread = threading.Thread(target = self._run, name = self.__class__.__name__, daemon = True)
+        self._thread.start()
+
+
+    def _task(self):
+        """The work to do every interval"""
+
+        raise NotImplementedError()
+
+
+    def _run(self):
+        """Run _task until stopped"""
+
+        while not self._stopEvent.wait(self.interval):
+            try:
+                self._task()
+
+            # try again next interval
+            except (TimeoutError, sql.Error) as error:
+                getLogger().error(f"{self.__class__.__name__} failed: {error}")
+
+
+    def stop(self, wait: bool = True):
+        """Stop the background thread.
+
+        wait:
+            Whether to wait for a running task to finish."""
+
+        self._stopEvent.set()
+        if wait and self._thread is not None:
+            self._thread.join()
+
+
+    @property
+    def running(self) -> bool:
+        """Get whether the background thread is alive"""
+
+        return self._thread is not None and self._thread.is_alive()
+
+
+class CheckpointScheduler(_PeriodicTask):
+    """
+    Checkpoints a WAL mode database on a background thread
+    so that the -wal file doesn't grow without bound.
+
+    ATTRIBUTES
+    pool: ConnectionPool
+        The pool of writable connections to checkpoint with.
+    mode: str
+        The checkpoint mode out of PASSIVE, FULL, RESTART, and TRUNCATE.
+    lastResult: (int, int, int) tuple
+        The (busy, walFrames, checkpointedFrames) result of the last checkpoint.
+    checkpoints: int
+        The number of checkpoints done.
+    """
+
+    # ATTRIBUTES
+    modes: Tuple[str] = ("PASSIVE", "FULL", "RESTART", "TRUNCATE")
+
+
+    def __init__(self, pool: ConnectionPool, interval: float = 30.0, mode: str = "PASSIVE"):
+        """
+        ARGUMENTS
+        pool:
+            The pool of writable connections to checkpoint with.
+        interval:
+            The number of seconds between checkpoints.
+        mode:
+            PASSIVE: copy what it can without waiting for readers or writers.
+            FULL: wait for writers then copy everything.
+            RESTART: FULL, then wait for readers so the -wal file is reused from the start.
+            TRUNCATE: RESTART, then truncate the -wal file.
+        """
+
+        mode = mode.upper()
+        if mode not in self.modes:
+            raise ValueError(f"Invalid mode ({mode})")
+
+        super().__init__(interval)
+        self.pool = pool
+        self.mode = mode
+        self.lastResult = None
+        self.checkpoints = 0
+
+
+    def checkpoint(self) -> Tuple[int, int, int]:
+        """Checkpoint now. Return the (busy, walFrames, checkpointedFrames) result."""
+
+        with self.pool.connection(timeout = self.interval) as connection:
+            self.lastResult = tuple(connection.execute(f"PRAGMA wal_checkpoint({self.mode});").fetchone())
+
+        self.checkpoints += 1
+        return self.lastResult
+
+
+    def _task(self):
+        self.checkpoint()
+
+
+class SnapshotScheduler(_PeriodicTask):
+    """
+    Snapshots an in-memory DBWriter to its file on a background thread.
+
+    ATTRIBUTES
+    db: DBWriter
+        The in-memory database to snapshot.
+    """
+
+    def __init__(self, db: 'DBWriter', interval: float = 60.0):
+        """
+        ARGUMENTS
+        db:
+            The in-memory database to snapshot.
+        interval:
+            The number of seconds between snapshots.
+        """
+
+        super().__init__(interval)
+        self.db = db
+
+
+    def _task(self):
+        self.db.snapshot()
+
+
+StatementStats = namedtuple("StatementStats", "query count total mean min max")
+
+
+class QueryTracer:
+    """
+    Times statements and aggregates their latencies per normalized query.
+    Statements slower than slowThreshold are logged with their query plans,
+    which points at missing indexes and full table scans.
+
+    ATTRIBUTES
+    slowThreshold: float
+        The number of seconds a statement must take to be logged.
+    logger: logging.Logger
+        The logger that slow statements are logged to.
+    slowCount: int
+        The number of slow statements.
+    workload: collections.deque of (str, tuple, bool) tuples or None
+        The most recent (query, vars, many) statements when capturing.
+        Can be replayed by IndexAdvisor.
+    _stats: str : list dict
+        The [count, total, min, max] of each normalized query.
+    _lock: threading.Lock
+        Guards _stats.
+    """
+
+    # ATTRIBUTES
+    sortKeys: Tuple[str] = ("total", "mean", "max", "count")
+
+
+    def __init__(self, slowThreshold: float = 0.1, logPath: str = None,
+        maxBytes: int = 1000000, backupCount: int = 3, captureLimit: int = 0):
+        """
+        ARGUMENTS
+        slowThreshold:
+            The number of seconds a statement must take to be logged.
+        logPath:
+            The file to log slow statements to. It's rotated once it reaches maxBytes.
+            Defaults to the MyUtils.db.slowQueries logger without a handler.
+        maxBytes:
+            The size of the log file before it's rotated.
+        backupCount:
+            The number of rotated log files to keep.
+        captureLimit:
+            The number of recent statements to keep in workload. 0 doesn't capture.
+        """
+
+        self.slowThreshold = slowThreshold
+        self.slowCount = 0
+        self.workload = deque(maxlen = captureLimit) if captureLimit else None
+        self._stats = {}
+        self._lock = threading.Lock()
+
+        if logPath is None:
+            self.logger = getLogger(f"{__name__}.slowQueries")
+
+        # not registered with logging so that each tracer has its own file
+        else:
+            self.logger = logging.Logger(f"{__name__}.slowQueries")
+            handler = RotatingFileHandler(logPath, maxBytes = maxBytes, backupCount = backupCount)
+            handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+            self.logger.addHandler(handler)
+
+
+    def record(self, query: str, vars: tuple, many: bool, duration: float,
+        connection: sql.Connection):
+        """Add a statement's duration to the stats and log it if it's slow.
+
+        connection:
+            The connection that ran the statement. Used to get the query plan."""
+
+        normalized = normalizeQuery(query)
+        with self._lock:
+            stats = self._stats.get(normalized)
+            if stats is None:
+                self._stats[normalized] = [1, duration, duration, duration]
+
+            else:
+                stats[0] += 1
+                stats[1] += duration
+                if duration < stats[2]:
+                    stats[2] = duration
+
+                if duration > stats[3]:
+                    stats[3] = duration
+
+        if self.workload is not None:
+            # executemany's parameters can only be replayed if they're a sequence
+            if not many or isinstance(vars, (list, tuple)):
+                self.workload.append((query, vars, many))
+
+        if duration >= self.slowThreshold:
+            self.slowCount += 1
+
+            # executemany's parameters may be a generator that's been used up
+            if many:
+                vars = vars[0] if isinstance(vars, (list, tuple)) and vars else None
+
+            message = f"slow query ({duration * 1000:.1f}ms): {normalized}"
+            for line in self.explain(connection, query, vars):
+                message += f"\n    {line}"
+
+            self.logger.warning(message)
+
+
+    @staticmethod
+    def explain(connection: sql.Connection, query: str, vars: tuple = ()) -> List[str]:
+        """Get the lines of EXPLAIN QUERY PLAN for query, indented by depth"""
+
+        if vars is None:
+            return ["plan unavailable: no parameters"]
+
+        try:
+            rows = connection.execute(f"EXPLAIN QUERY PLAN {query}", vars).fetchall()
+
+        except sql.Error as error:
+            return [f"plan unavailable: {error}"]
+
+        # each step's parent is an earlier step
+        depths = {0 : -1}
+        lines = []
+        for id_, parent, _, detail in rows:
+            depths[id_] = depths.get(parent, -1) + 1
+            lines.append("  " * depths[id_] + detail)
+
+        return lines
+
+
+    def topStatements(self, n: int = 10, key: str = "total") -> List[StatementStats]:
+        """Get the n slowest normalized queries.
+
+        key:
+            What to sort by out of total, mean, max, and count."""
+
+        if key not in self.sortKeys:
+            raise ValueError(f"Invalid key ({key})")
+
+        with self._lock:
+            stats = [StatementStats(query, count, total, total / count, min_, max_)
+                for query, (count, total, min_, max_) in self._stats.items()]
+
+        return sorted(stats, key = lambda stat: getattr(stat, key), reverse = True)[:n]
+
+
+    def report(self, n: int = 10, key: str = "total") -> str:
+        """Get the n slowest normalized queries as a table"""
+
+        lines = [f"{'count':>8} {'total ms':>10} {'mean ms':>9} {'max ms':>9}  query"]
+        for stat in self.topStatements(n, key):
+            lines.append(f"{stat.count:>8} {stat.total * 1000:>10.1f} {stat.mean * 1000:>9.2f} "
+                f"{stat.max * 1000:>9.2f}  {stat.query}")
+
+        return "\n".join(lines)
+
+
+    def reset(self):
+        """Clear the stats"""
+
+        with self._lock:
+            self._stats = {}
+            self.slowCount = 0
+            if self.workload is not None:
+                self.workload.clear()
+
+
+IndexSuggestion = namedtuple("IndexSuggestion", "table columns statement before after improvement")
+
+_SCAN_STEP = re.compile(r"^SCAN (?:TABLE )?(\w+)(?: AS (\w+))?$")
+_TABLE_REFERENCE = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", re.IGNORECASE)
+_COMPARISON = re.compile(r"(?:\b(\w+)\.)?\b(\w+)\s*(==|=|IN\b|IS\b|<=|>=|<|>|BETWEEN\b|LIKE\b|GLOB\b)",
+    re.IGNORECASE)
+_ORDER_BY = re.compile(r"\b(?:ORDER|GROUP)\s+BY\s+(.+?)(?:\bLIMIT\b|\bHAVING\b|\bORDER\b|$)",
+    re.IGNORECASE | re.DOTALL)
+_KEYWORDS = {"WHERE", "ON", "JOIN", "LEFT", "RIGHT", "INNER", "OUTER", "CROSS", "NATURAL",
+    "GROUP", "ORDER", "LIMIT", "USING", "HAVING", "UNION", "SET", "VALUES"}
+
+
+class IndexAdvisor:
+    """
+    Suggests indexes for a captured workload.
+    The workload is replayed against a copy of the database
+    and the candidates are indexes on the columns that full table scans filter or sort by.
+    Each candidate is kept only if it makes the workload faster.
+
+    ATTRIBUTES
+    workload: list of (str, tuple, bool) tuples
+        The (query, vars, many) statements to replay.
+        Transaction control, PRAGMA, VACUUM, ATTACH, and DETACH statements are left out.
+    repeats: int
+        The number of times the workload is replayed per measurement. The fastest is kept.
+    connection: sqlite3.Connection
+        The connection to the copy of the database.
+    _copyPath: str
+        The path to the copy.
+    """
+
+    def __init__(self, source: Union['DBWriter', str], workload: Iterable[tuple] = None,
+        repeats: int = 3):
+        """
+        ARGUMENTS
+        source:
+            The DBWriter or the path to the database to copy.
+        workload:
+            The (query, vars, many) statements to replay.
+            Defaults to the workload captured by source's tracer.
+        repeats:
+            The number of times the workload is replayed per measurement.
+        """
+
+        if workload is None:
+            if isinstance(source, str) or source.tracer is None or source.tracer.workload is None:
+                raise ValueError("No workload was passed or captured")
+
+            workload = source.tracer.workload
+
+        self.workload = [statement for statement in workload if not _UNREPLAYABLE.match(statement[0])]
+        self.repeats = repeats
+
+        # copy with the backup API so the original isn't affected
+        descriptor, self._copyPath = tempfile.mkstemp(suffix = ".db")
+        os.close(descriptor)
+        self.connection = sql.connect(self._copyPath)
+
+        if isinstance(source, str):
+            with sql.connect(source) as original:
+                original.backup(self.connection)
+
+        else:
+            with source.pool.connection() as original:
+                original.backup(self.connection)
+
+        self.connection.execute("ANALYZE;")
+
+
+    def scans(self) -> Dict[str, Set[str]]:
+        """Get the workload's queries that do full table scans. Format: table : queries"""
+
+        scans = {}
+        for query in {query for query, _, _ in self.workload}:
+            try:
+                plan = self.connection.execute(f"EXPLAIN QUERY PLAN {query}", self._firstVars(query)).fetchall()
+
+            except sql.Error:
+                continue
+
+            aliases = self._aliases(query)
+            for step in plan:
+                match = _SCAN_STEP.match(step[3])
+                if match:
+                    table = aliases.get(match.group(2) or match.group(1), match.group(1))
+                    scans.setdefault(table, set()).add(query)
+
+        return scans
+
+
+    def candidates(self) -> List[Tuple[str, Tuple[str]]]:
+        """Get the (table, columns) indexes that could replace the full table scans.
+        Each filtered or sorted column gets a single column index and each query's
+        equality columns followed by its first range column get a composite index."""
+
+        candidates = []
+        for table, queries in self.scans().items():
+            columns = {row[1].lower() : row[1] for row in self.connection.execute(f"PRAGMA table_info({table});")}
+
+            for query in queries:
+                aliases = self._aliases(query)
+                equality, ranges = [], []
+
+                for qualifier, column, operator in _COMPARISON.findall(query):
+                    # qualified columns must belong to the scanned table
+                    if qualifier and aliases.get(qualifier, qualifier).lower() != table.lower():
+                        continue
+
+                    column = columns.get(column.lower())
+                    if column is None:
+                        continue
+
+                    target = equality if operator.upper() in ("=", "==", "IN", "IS") else ranges
+                    if column not in target:
+                        target.append(column)
+
+                for clause in _ORDER_BY.findall(query):
+                    for term in clause.split(","):
+                        column = columns.get(term.split()[0].split(".")[-1].lower()) if term.split() else None
+                        if column is not None and column not in ranges and column not in equality:
+                            ranges.append(column)
+
+                for column in equality + ranges:
+                    if (table, (column, )) not in candidates:
+                        candidates.append((table, (column, )))
+
+                composite = tuple(equality + ranges[:1])
+                if len(composite) > 1 and (table, composite) not in candidates:
+                    candidates.append((table, composite))
+
+        return candidates
+
+
+    def measure(self) -> float:
+        """Replay the workload. Return the fastest of repeats runs in seconds.
+        Writes and schema changes are rolled back after each run so that every run sees the same data."""
+
+        best = None
+        for _ in range(self.repeats):
+            start = perf_counter()
+
+            # sqlite3's implicit transactions don't cover every statement
+            self.connection.execute("BEGIN;")
+            try:
+                for query, vars, many in self.workload:
+                    if many:
+                        self.connection.executemany(query, vars).fetchall()
+
+                    else:
+                        self.connection.execute(query, vars).fetchall()
+
+            finally:
+                self.connection.rollback()
+
+            duration = perf_counter() - start
+            best = duration if best is None else min(best, duration)
+
+        return best
+
+
+    def advise(self, minImprovement: float = 0.05) -> List[IndexSuggestion]:
+        """Measure the workload with each candidate index.
+        Return the suggestions that improve it, best first.
+
+        minImprovement:
+            The fraction of the workload's time that an index must save to be suggested."""
+
+        before = self.measure()
+        suggestions = []
+
+        for table, columns in self.candidates():
+            statement = f"CREATE INDEX idx_{table}_{'_'.join(columns)} ON {table} ({', '.join(columns)});"
+            self.connection.execute(f"CREATE INDEX advisor_candidate ON {table} ({', '.join(columns)});")
+            self.connection.execute("ANALYZE;")
+            try:
+                after = self.measure()
+
+            finally:
+                self.connection.execute("DROP INDEX advisor_candidate;")
+
+            improvement = (before - after) / before if before else 0.0
+            if improvement >= minImprovement:
+                suggestions.append(IndexSuggestion(table, columns, statement, before, after, improvement))
+
+        return sorted(suggestions, key = lambda suggestion: suggestion.improvement, reverse = True)
+
+
+    def _firstVars(self, query: str) -> tuple:
+        """Get the parameters of query's first statement in the workload"""
+
+        for query_, vars, many in self.workload:
+            if query_ == query:
+                return (vars[0] if vars else ()) if many else vars
+
+        return ()
+
+
+    @staticmethod
+    def _aliases(query: str) -> Dict[str, str]:
+        """Get the tables referenced by query. Format: alias or name : table"""
+
+        aliases = {}
+        for table, alias in _TABLE_REFERENCE.findall(query):
+            aliases[table] = table
+            if alias and alias.upper() not in _KEYWORDS:
+                aliases[alias] = table
+
+        return aliases
+
+
+    def close(self):
+        """Close and delete the copy"""
+
+        self.connection.close()
+        os.remove(self._copyPath)
+
+
+    def __enter__(self) -> 'IndexAdvisor':
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class QueryCache:
+    """
+    LRU cache of read results keyed by query and parameters.
+    Entries are dropped when a table they read from is written to.
+    The tables a query reads are reported by SQLite's authorizer the first time it runs.
+    Writes are found by parsing the statements DBWriter.doQuery commits,
+    along with the tables that the triggers and cascading foreign keys of those tables change.
+    Writes made outside of this process or through a raw cursor need .invalidate().
+
+    ATTRIBUTES
+    maxEntries: int
+        The maximum number of cached queries.
+    maxRows: int
+        The maximum number of cached rows across every entry.
+    hits: int
+        The number of reads served from the cache.
+    misses: int
+        The number of reads that weren't cached.
+    views: set of str
+        The lowercase names of the views. Their entries are dropped by any write.
+    dependents: str : set of str dict
+        The tables that writing to a table also changes. Format: table : tables
+    ticket: int property
+        Changes on every invalidation. Results read before a change aren't cached.
+    stats: dict property
+        The hit and size metrics.
+    _entries: collections.OrderedDict
+        The (results, tables) of each key, least recently used first.
+    _byTable: str : set dict
+        The keys that read each table.
+    _readTables: str : frozenset dict
+        The tables that each query reads, oldest first.
+    _rows: int
+        The number of cached rows.
+    _ticket: int
+        Incremented by every invalidation.
+    _lock: threading.Lock
+        Guards the entries.
+    """
+
+    def __init__(self, maxEntries: int = 1024, maxRows: int = 100000):
+        """
+        ARGUMENTS
+        maxEntries:
+            The maximum number of cached queries.
+        maxRows:
+            The maximum number of cached rows across every entry.
+            Results with more rows aren't cached.
+        """
+
+        self.maxEntries = maxEntries
+        self.maxRows = maxRows
+        self.hits = 0
+        self.misses = 0
+        self.views = set()
+        self.dependents = {}
+
+        self._entries = OrderedDict()
+        self._byTable = {}
+        self._readTables = {}
+        self._rows = 0
+        self._ticket = 0
+        self._lock = threading.Lock()
+
+
+    @staticmethod
+    def key(query: str, vars: Any, useRow: bool) -> Hashable:
+        """Get the cache key of a read. Return None if its parameters are unhashable."""
+
+        if isinstance(vars, dict):
+            vars = tuple(sorted(vars.items()))
+
+        elif isinstance(vars, list):
+            vars = tuple(vars)
+
+        key = (query, vars, useRow)
+        try:
+            hash(key)
+
+        except TypeError:
+            return None
+
+        return key
+
+
+    def get(self, key: Hashable) -> List[Any]:
+        """Get a copy of the cached results of key. Return None if it isn't cached."""
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+        return list(entry[0])
+
+
+    def tablesOf(self, query: str) -> FrozenSet[str]:
+        """Get the tables that query reads. Return None if it hasn't been put yet."""
+
+        return self._readTables.get(query)
+
+
+    def put(self, key: Hashable, results: List[Any], ticket: int, tables: Iterable[str] = None):
+        """Cache the results of key.
+
+        ticket:
+            The ticket from before the read. Nothing is cached if there's been an invalidation since.
+        tables:
+            The lowercase names of the tables the read used. Defaults to the ones found by parsing the query."""
+
+        if tables is not None:
+            tables = frozenset(tables)
+            with self._lock:
+                self._readTables[key[0]] = tables
+                if len(self._readTables) > self.maxEntries:
+                    del self._readTables[next(iter(self._readTables))]
+
+        else:
+            tables = self.tablesOf(key[0])
+            if tables is None:
+                tables = _readTables(key[0])
+
+        if len(results) > self.maxRows:
+            return
+
+        if tables & self.views:
+            tables = tables | {"*"}
+
+        with self._lock:
+            if ticket != self._ticket or key in self._entries:
+                return
+
+            self._entries[key] = (list(results), tables)
+            self._rows += len(results)
+            for table in tables:
+                self._byTable.setdefault(table, set()).add(key)
+
+            # evict the least recently used
+            while len(self._entries) > self.maxEntries or self._rows > self.maxRows:
+                self._remove(next(iter(self._entries)))
+
+
+    def _remove(self, key: Hashable):
+        """Drop an entry. Must be called while holding _lock."""
+
+        results, tables = self._entries.pop(key)
+        self._rows -= len(results)
+        for table in tables:
+            keys = self._byTable.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._byTable[table]
+
+
+    def invalidate(self, tables: Iterable[str] = None):
+        """Drop the entries that read from tables or their dependents.
+        None drops every entry."""
+
+        with self._lock:
+            self._ticket += 1
+
+            if tables is None:
+                # the schema might have changed what a query reads
+                self._entries.clear()
+                self._byTable.clear()
+                self._readTables.clear()
+                self._rows = 0
+                return
+
+            # any write can change a view
+            toDrop = {"*"}
+            pending = [table.lower() for table in tables]
+            while pending:
+                table = pending.pop()
+                if table not in toDrop:
+                    toDrop.add(table)
+                    pending.extend(self.dependents.get(table, ()))
+
+            for table in toDrop:
+                for key in list(self._byTable.get(table, ())):
+                    self._remove(key)
+
+
+    def clear(self):
+        """Drop every entry"""
+
+        self.invalidate()
+
+
+    @property
+    def ticket(self) -> int:
+        """Get the current ticket"""
+
+        return self._ticket
+
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        """Get the hit and size metrics"""
+
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries" : len(self._entries),
+                "rows" : self._rows,
+                "hits" : self.hits,
+                "misses" : self.misses,
+                "hitRate" : self.hits / lookups if lookups else 0.0,
+                }
+
+
+class QueryStream:
+    """
+    Iterates over the results of a query in batches
+    so that only one batch is in memory at once.
+    Close it (or use it as a context manager) when stopping early.
+
+    ATTRIBUTES
+    cursor: sqlite3.Cursor
+        The dedicated cursor of the query. None once closed.
+    batchSize: int
+        The number of rows fetched at once.
+    rowType: str
+        The type of the rows out of tuple, namedtuple, and row.
+    columns: tuple of str property
+        The column names of the results.
+    closed: bool property
+        Whether the cursor has been closed.
+    onClose: callable or None
+        Called once the cursor is closed. e.g. to return its connection to a pool.
+    """
+
+    # ATTRIBUTES
+    rowTypes: Tuple[str] = ("tuple", "namedtuple", "row")
+
+
+    def __init__(self, cursor: sql.Cursor, batchSize: int = 1000, rowType: str = "tuple",
+        onClose: Callable[[], Any] = None):
+        """
+        ARGUMENTS
+        cursor:
+            A cursor that has executed the query. Its results mustn't have been fetched.
+        batchSize:
+            The number of rows to fetch at once.
+        rowType:
+            tuple: plain tuples.
+            namedtuple: tuples that also allow attribute access by column name.
+            row: sqlite3.Row objects that allow dict-like access.
+        onClose:
+            Called once the cursor is closed.
+        """
+
+        if rowType not in self.rowTypes:
+            raise ValueError(f"Invalid rowType ({rowType})")
+
+        if batchSize < 1:
+            raise ValueError("batchSize must be at least 1")
+
+        self.cursor = cursor
+        self.batchSize = batchSize
+        self.rowType = rowType
+        self.onClose = onClose
+
+        self.cursor.row_factory = sql.Row if rowType == "row" else None
+
+
+    def batches(self) -> Iterator[List[Any]]:
+        """Generator for the lists of up to batchSize rows"""
+
+        makeRow = _namedRow(self.columns)._make if self.rowType == "namedtuple" else None
+
+        try:
+            while self.cursor is not None:
+                rows = self.cursor.fetchmany(self.batchSize)
+                if not rows:
+                    break
+
+                yield rows if makeRow is None else list(map(makeRow, rows))
+
+        # also runs when the caller stops early and the generator is discarded
+        finally:
+            self.close()
+
+
+    def __iter__(self) -> Iterator[Any]:
+        """Generator for the rows"""
+
+        for batch in self.batches():
+            yield from batch
+
+
+    def close(self):
+        """Close the cursor. Safe to call more than once."""
+
+        if self.cursor is not None:
+            self.cursor.close()
+            self.cursor = None
+
+            if self.onClose is not None:
+                self.onClose()
+
+
+    def __enter__(self) -> 'QueryStream':
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+    def __del__(self):
+        self.close()
+
+
+    @property
+    def columns(self) -> Tuple[str]:
+        """Get the column names of the results"""
+
+        if self.cursor is None or self.cursor.description is None:
+            return ()
+
+        return tuple(column[0] for column in self.cursor.description)
+
+
+    @property
+    def closed(self) -> bool:
+        """Get whether the cursor has been closed"""
+
+        return self.cursor is None
+
+
+class _GroupCommitter:
+    """
+    Does a DBWriter's group commit writes on one thread with one connection.
+    Writes are committed together once no more are queued, maxWrites rows are pending,
+    or the oldest is maxDelay seconds old, so the writes of concurrent threads share a commit.
+    A write's Future resolves once it's committed, or fails with the commit's error,
+    so a write that returned is never rolled back.
+    The writes are traced here, as the query plans must be read on the thread that uses the connection.
+    Only this thread holds the write lock, so other threads' transactions just wait for the next commit.
+
+    ATTRIBUTES
+    db: DBWriter
+        The database to write to.
+    maxWrites: int
+        The number of pending rows that triggers a commit.
+    maxDelay: float
+        The maximum age in seconds of an uncommitted write.
+    busyRetries: int
+        The number of times a commit is tried again while other connections hold the database.
+        Each try waits for the connection's busy timeout first.
+    _queue: queue.Queue
+        The (query, vars, many, future) writes. query is None for flushes.
+    _thread: threading.Thread
+        The committer thread.
+    """
+
+    # ATTRIBUTES
+    busyRetries = 3
+    _stop = object()  # queued by .close() to stop the committer thread
+
+
+    def __init__(self, db: 'DBWriter', maxWrites: int, maxDelay: float):
+        self.db = db
+        self.maxWrites = maxWrites
+        self.maxDelay = maxDelay
+        self._queue = Queue()
+
+        self._thread = threading.Thread(target = self._run, name = "GroupCommit", daemon = True)
+        self._thread.start()
+
+
+    def submit(self, query: str, vars: tuple = (), many: bool = False) -> Future:
+        """Queue a write. Return a Future of its results that resolves once it's committed."""
+
+        future = Future()
+        self._queue.put((query, vars, many, future))
+        return future
+
+
+    def flush(self):
+        """Commit the pending writes now"""
+
+        if threading.current_thread() is self._thread:
+            return
+
+        future = Future()
+        self._queue.put((None, None, None, future))
+        future.result()
+
+
+    def close(self):
+        """Commit the pending writes and stop the committer thread"""
+
+        self._queue.put(self._stop)
+        self._thread.join()
+
+
+    def _run(self):
+        """Do the queued writes and commit them when a threshold is reached"""
+
+        db = self.db
+        waiting = []  # the (future, results) of each uncommitted write
+        pending = 0
+        first = None
+
+        while True:
+            # nothing is pending while waiting, as the writes are committed once the queue empties
+            item = self._queue.get()
+            if item is self._stop:
+                break
+
+            query, vars, many, future = item
+            if query is None:
+                future.set_result(None)
+                continue
+
+            try:
+                start = perf_counter()
+                cursor = db.cursor
+                if not many:
+                    cursor.execute(query, vars)
+
+                else:
+                    cursor.executemany(query, vars)
+
+                if db.cache is not None:
+                    db._markDirty(query)
+
+                results = cursor.fetchall()
+                if db.tracer is not None:
+                    db.tracer.record(query, vars, many, perf_counter() - start, cursor.connection)
+
+                # sqlite3 only opens a transaction for writes
+                if cursor.connection.in_transaction:
+                    waiting.append((future, results))
+                    pending += max(cursor.rowcount, 1)
+                    if first is None:
+                        first = perf_counter()
+
+                else:
+                    future.set_result(results)
+
+            except Exception as error:
+                future.set_exception(error)
+
+            if waiting and (self._queue.empty() or pending >= self.maxWrites
+                            or perf_counter() - first >= self.maxDelay):
+                self._commit(waiting)
+                waiting, pending, first = [], 0, None
+
+        db.releaseConnection()
+
+
+    def _commit(self, waiting: List[Tuple[Future, tuple]]):
+        """Commit the committer's connection and settle the Futures of the writes it holds"""
+
+        connection = self.db.pool.threadConnection(create = False)
+        for attempt in range(self.busyRetries + 1):
+            try:
+                connection.commit()
+                error = None
+                break
+
+            except sql.OperationalError as commitError:
+                error = commitError
+
+                # only a busy database is worth waiting for
+                if getattr(error, "sqlite_errorcode", sql.SQLITE_BUSY) & 0xff not in (sql.SQLITE_BUSY, sql.SQLITE_LOCKED):
+                    break
+
+            except Exception as commitError:
+                error = commitError
+                break
+
+        if error is not None:
+            getLogger().error(f"Group commit failed: {error}")
+            connection.rollback()
+
+        self.db._invalidateDirty()
+
+        for future, results in waiting:
+            if error is None:
+                future.set_result(results)
+
+            else:
+                future.set_exception(error)
+
+
 class DBWriter:
     """
     Handles the database connection and reading and writing to it.
-    
+    Each thread gets its own connection from pool,
+    so one instance can be shared between threads.
+
     ATTRIBUTES
     path: str
         The path to the .db file.
-    connection: sqlite3.Connection
-        The connection obejct for path. 
-        Used to commit queries.
-    cursor: sqlite3.Cursor
-        The cursor for connection.
+    pool: ConnectionPool
+        The pool that the connections are taken from.
+        Can be passed to other instances to share the connections.
+    connection: sqlite3.Connection property
+        The calling thread's connection.
+        Used to commit queries. Held until .releaseConnection().
+    cursor: sqlite3.Cursor property
+        The calling thread's cursor for connection.
         Used to execute queries.
+    groupCommit: (int, float) tuple or None
+        The (maxWrites, maxDelay) thresholds of group commit mode.
+        None when each write is committed immediately.
+    _committer: _GroupCommitter or None
+        Does the writes in group commit mode.
+    readPool: ConnectionPool or None
+        The read-only connections that reads are routed to in WAL mode.
+    tracer: QueryTracer or None
+        Times doQuery's statements when tracing is on.
+    cache: QueryCache or None
+        Serves repeated doQuery reads when caching is on.
+    checkpointer: CheckpointScheduler or None
+        Checkpoints the WAL in the background.
+    memoryURI: str or None
+        The URI of the database when it's in memory.
+    snapshotPages: int
+        The number of pages copied per step of a snapshot.
+    snapshotOnClose: bool
+        Whether .close() snapshots an in-memory database.
+    snapshotter: SnapshotScheduler or None
+        Snapshots an in-memory database in the background.
+    _anchor: sqlite3.Connection or None
+        Keeps an in-memory database alive and is the source of the snapshots.
+    _snapshotLock: threading.Lock
+        Stops snapshots from overlapping.
+    _rowFactory: sqlite3.Row or None
+        The row_factory given to the cursors.
+    _local: threading.local
+        Holds the cursors, transaction depth,
+        and group commit state of each thread.
     """
 
-    def __init__(self, name: str, useRow: bool = False, use16Bit: bool = False):
-        """Create sqlite3 Connection and Cursor to the database called `name`.
-        If said DB doesn't exist, it'll be created at .../Databases/`name`.db
-        
-        name:
-            The name describing what the database contains.
-        useRow:
-            Whether to output tuples that can be accessed like dicts (True),
-            or to output tuples (False).
-        use16Bit:
-            Whether to use UTF-8 (False) or UTF-16 (True) encoding"""
+    # ATTRIBUTES
+    transactionModes: Tuple[str] = ("DEFERRED", "IMMEDIATE", "EXCLUSIVE")
+    durabilityLevels: Tuple[str] = ("OFF", "NORMAL", "FULL", "EXTRA")
+
+
+    def __init__(self, name: str, useRow: bool = False, use16Bit: bool = False,
+        poolSize: int = 5, pool: ConnectionPool = None, inMemory: bool = False,
+        warmLoad: bool = True, snapshotInterval: float = None, snapshotPages: int = 1024,
+        snapshotOnClose: bool = True):
+        """Create a pool of sqlite3 Connections to the database called `name`.
+        If said DB doesn't exist, it'll be created at .../Databases/`name`.db
+
+        name:
+            The name describing what the database contains.
+        useRow:
+            Whether to output tuples that can be accessed like dicts (True),
+            or to output tuples (False).
+        use16Bit:
+            Whether to use UTF-8 (False) or UTF-16 (True) encoding
+        poolSize:
+            The maximum number of connections. A thread only holds one while it's
+            in a doQuery call or a transaction, or after using .cursor or .connection directly.
+        pool:
+            An existing pool to use instead of creating one.
+            name, use16Bit, poolSize, and the in-memory arguments are ignored if this is passed.
+        inMemory:
+            Whether to keep the database in RAM. The .db file is only used for snapshots.
+        warmLoad:
+            Whether an in-memory database starts as a copy of the .db file.
+        snapshotInterval:
+            The number of seconds between snapshots of an in-memory database to the .db file.
+            None only snapshots on .snapshot() and .close().
+        snapshotPages:
+            The number of pages copied per step of a snapshot.
+        snapshotOnClose:
+            Whether .close() snapshots an in-memory database."""
+
+        # these could be class attributes
+        # but putting them here allows an instance
+        # to be reset by re-instantiating it
+        self.path = ""
+        self.pool = None
+        self.groupCommit = None
+        self._committer = None
+        self.readPool = None
+        self.checkpointer = None
+        self.tracer = None
+        self.cache = None
+        self.memoryURI = None
+        self.snapshotPages = snapshotPages
+        self.snapshotOnClose = snapshotOnClose
+        self.snapshotter = None
+        self._anchor = None
+        self._snapshotLock = threading.Lock()
+        self._local = threading.local()
+
+        # allow dict accessing of query results
+        self._rowFactory = sql.Row if useRow else None
+
+        if pool is None:
+            self.createDB(name)
+            if inMemory:
+                self.createMemoryDB(name, warmLoad)
+
+            self.createConnection(poolSize, use16Bit)
+
+            if inMemory and snapshotInterval:
+                self.snapshotter = SnapshotScheduler(self, snapshotInterval)
+                self.snapshotter.start()
+
+        # the database and its PRAGMAs were set up by the pool's creator
+        else:
+            self.pool = pool
+            self.path = pool.database
+
+
+    def createDB(self, name: str):
+        """Create a directory and a DB if not exists. Return the path to self.path."""
+
+        # get current directory
+        currentDirectory = os.path.dirname(__file__)
+
+        # create directory
+        newPath = os.path.join(currentDirectory, "Databases")
+        try:
+            os.mkdir(newPath)
+
+        except FileExistsError:
+            pass
+
+        #create file
+        filePath = os.path.join(newPath, f"{name}.db")
+        try:
+            with open(filePath):
+                pass
+
+        except FileNotFoundError:
+            with open(filePath, "w+"):
+                pass
+
+        self.path = filePath
+
+
+    def createConnection(self, poolSize: int = 5, use16Bit: bool = False):
+        """Create the connection pool for self.path. Return it to self.pool"""
+
+        pragmas = {
+            # set up the foreign keys on each connection
+            # due to a limitation of sqlite requiring this for each connection
+            "foreign_keys" : 1,
+            # set encoding
+            "encoding" : "'UTF-16'" if use16Bit else "'UTF-8'",
+            }
+
+        if self.memoryURI is None:
+            self.pool = ConnectionPool(self.path, maxSize = poolSize, pragmas = pragmas)
+
+        else:
+            self.pool = ConnectionPool(self.memoryURI, maxSize = poolSize, uri = True, pragmas = pragmas)
+
+
+    def createMemoryDB(self, name: str, warmLoad: bool = True):
+        """Create an in-memory database shared by every connection in this process.
+        Return its URI to self.memoryURI.
+
+        warmLoad:
+            Whether to copy self.path into it."""
+
+        # memdb databases support the same locking as files, unlike shared cache ones
+        if sql.sqlite_version_info >= (3, 36, 0):
+            self.memoryURI = f"file:/{name}?vfs=memdb"
+
+        else:
+            self.memoryURI = f"file:{name}?mode=memory&cache=shared"
+
+        # the database is freed once its last connection closes
+        self._anchor = sql.connect(self.memoryURI, uri = True, check_same_thread = False)
+
+        if warmLoad and os.path.getsize(self.path):
+            disk = sql.connect(self.path)
+            try:
+                if disk.execute("PRAGMA journal_mode;").fetchone()[0].lower() != "wal":
+                    disk.backup(self._anchor)
+
+                else:
+                    self._loadWAL(disk)
+
+            finally:
+                disk.close()
+
+
+    def _loadWAL(self, disk: sql.Connection):
+        """Copy a WAL mode database into the in-memory database.
+        Copies keep the WAL mark in their header, which in-memory databases can't open,
+        so the copy is staged in a private database and marked as rollback journal mode first."""
+
+        staging = sql.connect(":memory:")
+        try:
+            disk.backup(staging)
+
+            # bytes 18 and 19 are the file format versions. 1 is rollback journal, 2 is WAL
+            if hasattr(staging, "serialize"):
+                image = bytearray(staging.serialize())
+                image[18:20] = b"\x01\x01"
+                staging.deserialize(bytes(image))
+
+            # VACUUM rewrites the header too but rebuilds every page
+            else:
+                staging.execute("VACUUM;")
+
+            staging.backup(self._anchor)
+
+        finally:
+            staging.close()
+
+
+    @property
+    def connection(self) -> sql.Connection:
+        """Get the calling thread's connection"""
+
+        return self.pool.threadConnection()
+
+
+    @property
+    def cursor(self) -> sql.Cursor:
+        """Get the calling thread's cursor. Creates if not exists."""
+
+        return self._threadCursor(self.pool.threadConnection(), "cursor")
+
+
+    def _threadCursor(self, connection: sql.Connection, name: str) -> sql.Cursor:
+        """Get the calling thread's cursor for connection stored as _local.`name`"""
+
+        cursor = getattr(self._local, name, None)
+
+        # the thread's connection changes after .releaseConnection()
+        if cursor is None or cursor.connection is not connection:
+            cursor = connection.cursor()
+            setattr(self._local, name, cursor)
+
+        cursor.row_factory = self._rowFactory
+        return cursor
+
+
+    def _hasUncommitted(self) -> bool:
+        """Check if the calling thread may have uncommitted writes"""
+
+        if getattr(self._local, "depth", 0):
+            return True
+
+        writer = self.pool.threadConnection(create = False)
+        return writer is not None and writer.in_transaction
+
+
+    def _reader(self, query: str) -> sql.Connection:
+        """Get the calling thread's read-only connection if query can be routed to it.
+        Otherwise, return None."""
+
+        # the readers can't see this thread's uncommitted writes
+        if self.readPool is None or not _isRead(query) or self._hasUncommitted():
+            return None
+
+        return self.readPool.threadConnection()
+
+
+    def doQuery(self, query: str, vars: tuple = (), many: bool = False) -> List[Any]:
+        """Do one or many queries to the connection and commit the changes.
+        Only use for safe queries or a mistake would be committed.
+        Inside .transaction() the changes are committed when the block exits.
+        In group commit mode they're committed once a threshold is reached.
+        Outside of a transaction the connection is returned to the pool afterwards."""
+
+        try:
+            return self._doQuery(query, vars, many)
+
+        finally:
+            self._releaseIdle()
+
+
+    def _doQuery(self, query: str, vars: tuple, many: bool) -> List[Any]:
+        """Do the queries for .doQuery()"""
+
+        # NOTE
+        # the changes will be committed no matter what
+        # hence this method is not always good to use
+        # it exists to cut down on cookie cutter lines for safe queries
+
+        start = perf_counter()
+
+        # uncommitted writes would be visible to this thread's reads only
+        cache = self.cache
+        cacheKey = None
+        readTables = None
+        if cache is not None and not many and _isRead(query) and not self._hasUncommitted():
+            cacheKey = cache.key(query, vars, self._rowFactory is not None)
+            if cacheKey is not None:
+                results = cache.get(cacheKey)
+                if results is not None:
+                    return results
+
+                ticket = cache.ticket
+
+                # ask SQLite which tables a new query reads, since parsing misses comma joins and schema names
+                if cache.tablesOf(query) is None:
+                    readTables = set()
+
+        # reads don't need to wait for the writers in WAL mode
+        reader = None if many else self._reader(query)
+        if reader is not None:
+            cursor = self._threadCursor(reader, "readCursor")
+            connection = reader
+            results = self._readWith(cursor, query, vars, readTables)
+
+        # group committed writes go through one thread so that no thread holds the write lock while idle
+        # waiting for the commit leaves nothing pending, so this thread's later reads on its own connection see the write
+        elif self._committer is not None and not getattr(self._local, "depth", 0) \
+            and (many or not _isRead(query)):
+            results = self._committer.submit(query, vars, many).result()
+
+            # traced by the committer
+            connection = None
+
+        else:
+            cursor = self.cursor
+            connection = cursor.connection
+
+            # sqlite3 handles escaping insertions
+            if readTables is not None:
+                self._readWith(cursor, query, vars, readTables, fetch = False)
+
+            elif not many:
+                cursor.execute(query, vars)
+
+            else:
+                cursor.executemany(query, vars)
+
+            if cache is not None and (many or not _isRead(query)):
+                self._markDirty(query)
+
+            # the transaction block commits
+            if not getattr(self._local, "depth", 0):
+                connection.commit()
+                self._invalidateDirty()
+
+            results = cursor.fetchall()
+
+        if self.tracer is not None and connection is not None:
+            self.tracer.record(query, vars, many, perf_counter() - start, connection)
+
+        if cacheKey is not None:
+            cache.put(cacheKey, results, ticket, readTables)
+
+        return results
+
+
+    @staticmethod
+    def _readWith(cursor: sql.Cursor, query: str, vars: Any, tables: set, fetch: bool = True) -> List[Any]:
+        """Run a read, adding the tables it uses to tables unless that's None"""
+
+        if tables is None:
+            cursor.execute(query, vars)
+            return cursor.fetchall() if fetch else None
+
+        # setting the authorizer makes the cached statements prepare again, so the callbacks run
+        connection = cursor.connection
+        connection.set_authorizer(_tableCollector(tables))
+        try:
+            cursor.execute(query, vars)
+
+        finally:
+            connection.set_authorizer(None)
+
+        return cursor.fetchall() if fetch else None
+
+
+    def _releaseIdle(self):
+        """Return the calling thread's connections to their pools unless they're in a transaction,
+        so that threads don't hold connections while they aren't using the database"""
+
+        if getattr(self._local, "depth", 0):
+            return
+
+        writer = self.pool.threadConnection(create = False)
+        if writer is not None and not writer.in_transaction:
+            self.pool.releaseThread()
+
+        if self.readPool is not None:
+            self.readPool.releaseThread()
+
+
+    def stream(self, query: str, vars: tuple = (), batchSize: int = 1000,
+        rowType: str = None) -> QueryStream:
+        """Do a query and iterate over its results without fetching them all at once.
+        Memory use is bounded by batchSize instead of the size of the results.
+
+        batchSize:
+            The number of rows to fetch at once.
+        rowType:
+            The type of the rows out of tuple, namedtuple, and row.
+            Defaults to row if useRow is on, otherwise tuple."""
+
+        if rowType is None:
+            rowType = "row" if self._rowFactory else "tuple"
+
+        # the thread's own connection is the only one that can see its uncommitted writes
+        if self._hasUncommitted():
+            connection = self.connection
+            onClose = None
+
+        # otherwise check a connection out for the stream's lifetime so it isn't pinned to the thread
+        else:
+            pool = self.readPool if self.readPool is not None and _isRead(query) else self.pool
+            connection = pool.acquire()
+            onClose = lambda: pool.release(connection)
+
+        # a dedicated cursor so doQuery doesn't discard the pending results
+        cursor = connection.cursor()
+        try:
+            cursor.execute(query, vars)
+
+        except Exception:
+            cursor.close()
+            if onClose is not None:
+                onClose()
+
+            raise
+
+        return QueryStream(cursor, batchSize, rowType, onClose)
+
+
+    @contextmanager
+    def transaction(self, mode: str = "DEFERRED") -> Iterator[sql.Cursor]:
+        """Run the queries in a with block as one transaction.
+        Commit when the block exits or roll back if it raises.
+        Nested blocks become savepoints that only roll back their own changes.
+
+        mode:
+            The locking behaviour out of DEFERRED, IMMEDIATE, and EXCLUSIVE.
+            Ignored for nested blocks."""
+
+        mode = mode.upper()
+        if mode not in self.transactionModes:
+            raise ValueError(f"Invalid mode ({mode})")
+
+        cursor = self.cursor
+        connection = cursor.connection
+        depth = getattr(self._local, "depth", 0)
+
+        if not depth:
+            # group committed writes shouldn't be rolled back with this transaction
+            self.flush()
+            connection.execute(f"BEGIN {mode};")
+
+        else:
+            connection.execute(f"SAVEPOINT nested{depth};")
+
+        self._local.depth = depth + 1
+        try:
+            yield cursor
+
+        except BaseException:
+            if not depth:
+                connection.rollback()
+                self._local.dirty = set()
+
+            else:
+                connection.execute(f"ROLLBACK TO nested{depth};")
+                connection.execute(f"RELEASE nested{depth};")
+
+            raise
+
+        else:
+            if not depth:
+                connection.commit()
+
+                # the cursor can write to any table
+                if self.cache is not None:
+                    self._local.dirty = None
+                    self._invalidateDirty()
+
+            else:
+                connection.execute(f"RELEASE nested{depth};")
+
+        finally:
+            self._local.depth = depth
+            if not depth:
+                self._releaseIdle()
+
+
+    def enableGroupCommit(self, maxWrites: int = 1000, maxDelay: float = 1.0,
+        durability: str = "NORMAL"):
+        """Commit doQuery's writes in groups instead of after every statement.
+        The writes of every thread are done on one background thread and connection,
+        which commits once no more writes are queued, maxWrites rows are uncommitted,
+        or the oldest uncommitted write is maxDelay seconds old.
+        doQuery returns once its write is committed, and raises if the commit fails,
+        so concurrent threads share commits instead of each doing their own.
+        A thread's reads always see its own writes, and other threads see them as soon as doQuery returns.
+        Writes inside .transaction() use the thread's own connection and commit with the transaction.
+        Call .flush() to commit now.
+        The background thread holds one of the pool's connections.
+
+        maxWrites:
+            The number of rows to write before committing.
+        maxDelay:
+            The maximum age in seconds of an uncommitted write.
+        durability:
+            The PRAGMA synchronous level out of OFF, NORMAL, FULL, and EXTRA.
+            OFF is the fastest but a power loss can corrupt the database.
+            NORMAL and above are safe from corruption,
+            FULL and above also keep committed writes after a power loss."""
+
+        durability = durability.upper()
+        if durability not in self.durabilityLevels:
+            raise ValueError(f"Invalid durability ({durability})")
+
+        self.pool.setPragma("synchronous", durability)
+
+        # the old committer's writes are committed before the new thresholds apply
+        if self._committer is not None:
+            self._committer.close()
+
+        self.groupCommit = (maxWrites, maxDelay)
+        self._committer = _GroupCommitter(self, maxWrites, maxDelay)
+
+
+    def disableGroupCommit(self):
+        """Go back to committing after every statement.
+        Commits the pending writes."""
+
+        committer, self._committer = self._committer, None
+        if committer is not None:
+            committer.close()
+
+        self.groupCommit = None
+
+
+    def flush(self):
+        """Commit the pending group commit writes
+        and the calling thread's uncommitted writes outside of a transaction"""
+
+        if self._committer is not None:
+            self._committer.flush()
+
+        connection = self.pool.threadConnection(create = False)
+        if connection is not None and connection.in_transaction \
+            and not getattr(self._local, "depth", 0):
+            connection.commit()
+            self._invalidateDirty()
+
+
+    def enableCache(self, maxEntries: int = 1024, maxRows: int = 100000) -> QueryCache:
+        """Serve repeated doQuery reads from memory until a table they read is written to.
+        Return the QueryCache. See QueryCache for the arguments and what counts as a write."""
+
+        self.cache = QueryCache(maxEntries, maxRows)
+        self._refreshCacheSchema()
+        return self.cache
+
+
+    def disableCache(self):
+        """Stop caching reads"""
+
+        self.cache = None
+
+
+    def _refreshCacheSchema(self):
+        """Give the cache the views and the tables changed by each table's triggers and cascades"""
+
+        views = set()
+        dependents = {}
+
+        # read with a raw cursor so the cache isn't involved
+        cursor = self.connection.cursor()
+        try:
+            for type_, name, table, statement in cursor.execute("SELECT type, name, tbl_name, sql "
+                "FROM sqlite_master WHERE type IN ('view', 'trigger', 'table');").fetchall():
+                if type_ == "view":
+                    views.add(name.lower())
+
+                elif type_ == "trigger":
+                    # a trigger body whose writes can't be found could change anything
+                    written = _writtenTables(statement or "") or {"*"}
+                    dependents.setdefault(table.lower(), set()).update(written)
+
+                else:
+                    for row in self.connection.execute(f"PRAGMA foreign_key_list({name});"):
+                        # the parent's updates and deletes can change the child
+                        if row[5] != "NO ACTION" or row[6] != "NO ACTION":
+                            dependents.setdefault(row[2].lower(), set()).add(name.lower())
+
+        finally:
+            cursor.close()
+            self._releaseIdle()
+
+        self.cache.views = views
+        self.cache.dependents = dependents
+
+
+    def _markDirty(self, query: str):
+        """Remember the tables that a write changed until it's committed"""
 
-        # these could be class attributes
-        # but putting them here allows an instance
-        # to be reset by re-instantiating it
-        self.path = ""
-        self.connection = None
+        # schema changes can change anything
+        if _SCHEMA_CHANGE.match(query):
+            self._local.schemaChanged = True
+            self._local.dirty = None
+            return
+
+        dirty = getattr(self._local, "dirty", set())
+        if dirty is None:
+            return
 
-        self.createDB(name)
-        self.createConnection()
-        self.cursor = self.connection.cursor()
-        # set up the foreign keys on each connection
-        # due to a limitation of sqlite requiring this for each connection
-        self.doQuery("PRAGMA foreign_keys = 1;")
+        tables = _writtenTables(query)
 
-        # set encoding
-        if use16Bit:
-            self.doQuery("PRAGMA encoding = 'UTF-16';")
+        # so can writes to tables that can't be found
+        if tables is None:
+            self._local.dirty = None
 
         else:
-            self.doQuery("PRAGMA encoding = 'UTF-8';")
+            dirty.update(tables)
+            self._local.dirty = dirty
 
-        # allow dict accessing of query results
-        if useRow:
-            self.cursor.row_factory = sql.Row
 
+    def _invalidateDirty(self):
+        """Drop the cached reads of the tables changed by the commit that just happened"""
 
-    def createDB(self, name: str):
-        """Create a directory and a DB if not exists. Return the path to self.path."""
+        if self.cache is None:
+            return
 
-        # get current directory
-        currentDirectory = os.path.dirname(__file__)
+        dirty = getattr(self._local, "dirty", set())
+        if dirty is None:
+            self.cache.clear()
 
-        # create directory
-        newPath = os.path.join(currentDirectory, "Databases")
-        try:
-            os.mkdir(newPath)
+        elif dirty:
+            self.cache.invalidate(dirty)
 
-        except FileExistsError:
-            pass
+        self._local.dirty = set()
 
-        #create file
-        filePath = newPath + f"\{name}.db"
+        if getattr(self._local, "schemaChanged", False):
+            self._local.schemaChanged = False
+            self._refreshCacheSchema()
+
+
+    def enableWAL(self, readers: int = 4, checkpointInterval: float = 30.0,
+        checkpointMode: str = "PASSIVE"):
+        """Switch the database to write-ahead logging so that reads don't wait for writes.
+        Reads made through doQuery and stream are routed to a pool of read-only connections
+        while writes keep using pool. SQLite still allows one writer at a time,
+        so use WriteBehind to funnel writes through one thread.
+
+        readers:
+            The maximum number of read-only connections (and so reading threads) at once.
+            0 keeps reads on the writable connections.
+        checkpointInterval:
+            The number of seconds between background checkpoints.
+            0 or None leaves checkpointing to SQLite's automatic checkpoints.
+        checkpointMode:
+            The CheckpointScheduler mode."""
+
+        # the journal mode is stored in the database file
+        mode = self.doQuery("PRAGMA journal_mode = WAL;")[0][0]
+        if mode.lower() != "wal":
+            raise sql.OperationalError(f"Unable to enable WAL mode (journal_mode is {mode})")
+
+        if readers and self.readPool is None:
+            uri = f"file:{pathname2url(os.path.abspath(self.path))}?mode=ro"
+            self.readPool = ConnectionPool(uri, maxSize = readers, uri = True)
+
+        if checkpointInterval and self.checkpointer is None:
+            self.checkpointer = CheckpointScheduler(self.pool, checkpointInterval, checkpointMode)
+            self.checkpointer.start()
+
+
+    def enableTracing(self, slowThreshold: float = 0.1, logPath: str = None,
+        maxBytes: int = 1000000, backupCount: int = 3, captureLimit: int = 0) -> QueryTracer:
+        """Time every doQuery statement and log the slow ones with their query plans.
+        Return the QueryTracer. Use its .topStatements() or .report() to find the slowest.
+        Pass captureLimit to record a workload for IndexAdvisor.
+        Group committed writes are timed on the committer thread without their wait for the commit.
+        See QueryTracer for the arguments."""
+
+        self.tracer = QueryTracer(slowThreshold, logPath, maxBytes, backupCount, captureLimit)
+        return self.tracer
+
+
+    def disableTracing(self):
+        """Stop timing statements"""
+
+        self.tracer = None
+
+
+    def importCSV(self, path: str, table: str, columns: Sequence[str] = None,
+        types: Dict[str, Callable] = None, chunkSize: int = 50000, deferIndexes: bool = True,
+        header: bool = True, delimiter: str = ",", encoding: str = "utf-8") -> int:
+        """Stream a CSV file into table. Return the number of rows imported.
+
+        columns:
+            The columns that the fields are written to.
+            Defaults to the header or, if there isn't one, all of the table's columns.
+        types:
+            The functions that convert each column's values. Format: column : function
+            The other columns are converted by their declared type. Empty fields become NULL.
+        chunkSize:
+            The number of rows per transaction.
+        deferIndexes:
+            Whether to drop table's non-unique indexes during the import and recreate them after.
+            Building an index once is much faster than updating it per row.
+            Unique indexes are kept so that duplicates are still rejected.
+        header:
+            Whether the first line contains the column names.
+        delimiter:
+            The character between fields."""
+
+        with open(path, newline = "", encoding = encoding) as f:
+            reader = csv.reader(f, delimiter = delimiter)
+            fileColumns = next(reader, None) if header else None
+            return self._importRows(table, columns or fileColumns, reader, types, chunkSize, deferIndexes, True)
+
+
+    def importJSONL(self, path: str, table: str, columns: Sequence[str] = None,
+        types: Dict[str, Callable] = None, chunkSize: int = 50000,
+        deferIndexes: bool = True, encoding: str = "utf-8") -> int:
+        """Stream a file of one JSON object per line into table. Return the number of rows imported.
+
+        columns:
+            The keys to import. Missing keys become NULL.
+            Defaults to the keys of the first object.
+        Unlike CSV, empty strings are kept as empty strings.
+        See .importCSV() for the other arguments."""
+
+        with open(path, encoding = encoding) as f:
+            records = (json.loads(line) for line in f if line.strip())
+            first = next(records, None)
+            if first is None:
+                return 0
+
+            if columns is None:
+                columns = list(first)
+
+            rows = (tuple(record.get(column) for column in columns) for record in chain((first, ), records))
+            return self._importRows(table, columns, rows, types, chunkSize, deferIndexes, False)
+
+
+    def _importRows(self, table: str, columns: Sequence[str], rows: Iterable[Sequence],
+        types: Dict[str, Callable], chunkSize: int, deferIndexes: bool, emptyIsNull: bool) -> int:
+        """Insert rows into table's columns in chunks of chunkSize per transaction.
+        Return the number of rows inserted.
+
+        emptyIsNull:
+            Whether empty strings become NULL."""
+
+        declared = {row[1] : row[2] for row in self.doQuery(f"PRAGMA table_info({table});")}
+        if not declared:
+            raise ValueError(f"No such table ({table})")
+
+        columns = list(columns or declared)
+        types = types or {}
+        coercers = [types.get(column) or _affinityCoercer(declared.get(column, ""), emptyIsNull) for column in columns]
+
+        query = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))});"
+        rows = (tuple(coerce(value) for coerce, value in zip(coercers, row)) for row in rows)
+
+        indexes = []
+        if deferIndexes:
+            # chunks are committed as they go, so dropping a unique index would let duplicates in
+            # and then fail to recreate it. (seq, name, unique, origin, partial)
+            nonUnique = {row[1] for row in self.doQuery(f"PRAGMA index_list({table});") if not row[2]}
+
+            # automatic indexes for UNIQUE and PRIMARY KEY have no SQL and can't be dropped
+            indexes = [(name, statement) for name, statement in self.doQuery("SELECT name, sql "
+                "FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL;", (table, ))
+                if name in nonUnique]
+            for name, _ in indexes:
+                self.doQuery(f"DROP INDEX {name};")
+
+        imported = 0
         try:
-            with open(filePath):
-                pass
+            while True:
+                chunk = list(islice(rows, chunkSize))
+                if not chunk:
+                    break
 
-        except FileNotFoundError:
-            with open(filePath, "w+"):
-                pass
+                with self.transaction("IMMEDIATE") as cursor:
+                    cursor.executemany(query, chunk)
 
-        self.path = filePath
+                imported += len(chunk)
 
+        # the indexes are recreated even if the import failed part way
+        finally:
+            for _, statement in indexes:
+                self.doQuery(statement)
 
-    @retry(logMsg = "Failed to create connection.")
-    def createConnection(self):
-        """Create DB connection. Return connection object to self.connection"""
+        return imported
 
-        self.connection = sql.connect(self.path)
 
+    def exportCSV(self, query: str, path: str, vars: tuple = (), header: bool = True,
+        batchSize: int = 10000, delimiter: str = ",", encoding: str = "utf-8") -> int:
+        """Stream the results of query into a CSV file. Return the number of rows exported.
 
-    def doQuery(self, query: str, vars: tuple = (), many: bool = False) -> List[Any]:
-        """Do one or many queries to the connection and commit the changes.
-        Only use for safe queries or a mistake would be committed."""
+        header:
+            Whether to write the column names first.
+        batchSize:
+            The number of rows in memory at once.
+        delimiter:
+            The character between fields."""
 
-        # NOTE
-        # the changes will be committed no matter what
-        # hence this method is not always good to use
-        # it exists to cut down on cookie cutter lines for safe queries
+        exported = 0
+        with self.stream(query, vars, batchSize, "tuple") as results, \
+            open(path, "w", newline = "", encoding = encoding) as f:
+            writer = csv.writer(f, delimiter = delimiter)
+            if header:
+                writer.writerow(results.columns)
+
+            for batch in results.batches():
+                writer.writerows(batch)
+                exported += len(batch)
+
+        return exported
+
+
+    def exportJSONL(self, query: str, path: str, vars: tuple = (), batchSize: int = 10000,
+        encoding: str = "utf-8") -> int:
+        """Stream the results of query into a file of one JSON object per line.
+        BLOBs are written as hex strings. Return the number of rows exported.
+
+        batchSize:
+            The number of rows in memory at once."""
+
+        exported = 0
+        with self.stream(query, vars, batchSize, "tuple") as results, \
+            open(path, "w", encoding = encoding) as f:
+            columns = results.columns
+            for batch in results.batches():
+                f.writelines(json.dumps(dict(zip(columns, row)), default = _jsonDefault) + "\n"
+                    for row in batch)
+                exported += len(batch)
+
+        return exported
+
+
+    def snapshot(self, pages: int = None):
+        """Copy an in-memory database to self.path.
+        The copy is done in steps of pages pages (defaults to snapshotPages)
+        and is restarted if the database is written to between steps.
+        self.path is only replaced once the copy is complete."""
+
+        if self._anchor is None:
+            raise ValueError("Only in-memory databases can be snapshotted")
+
+        with self._snapshotLock:
+            disk = sql.connect(self.path)
+            try:
+                self._anchor.backup(disk, pages = pages or self.snapshotPages)
+
+            finally:
+                disk.close()
 
-        # sqlite3 handles escaping insertions
-        if not many:
-            self.cursor.execute(query, vars)
+
+    def createSearchIndex(self, table: str, columns: Sequence[str], tokenizer: str = "unicode61",
+        prefixes: Sequence[int] = (2, 3)):
+        """Create an FTS5 full-text index of table's columns called `table`_fts.
+        Triggers keep it in sync with table. Search it with .search().
+        table must have a rowid (not be WITHOUT ROWID).
+
+        columns:
+            The text columns to index.
+        tokenizer:
+            The FTS5 tokenizer. e.g. unicode61, porter unicode61, trigram
+        prefixes:
+            The prefix lengths to index so that prefix searches of those lengths are fast."""
+
+        fts = f"{table}_fts"
+        names = ", ".join(columns)
+        new = ", ".join(f"new.{column}" for column in columns)
+        old = ", ".join(f"old.{column}" for column in columns)
+        prefixOption = f", prefix = '{' '.join(map(str, prefixes))}'" if prefixes else ""
+
+        with self.transaction("IMMEDIATE"):
+            # external content: the text is only stored in table
+            self.doQuery(f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({names}, content = '{table}', "
+                f"content_rowid = 'rowid', tokenize = '{tokenizer}'{prefixOption});")
+
+            self.doQuery(f"CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} BEGIN "
+                f"INSERT INTO {fts} (rowid, {names}) VALUES (new.rowid, {new}); END;")
+            self.doQuery(f"CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} BEGIN "
+                f"INSERT INTO {fts} ({fts}, rowid, {names}) VALUES ('delete', old.rowid, {old}); END;")
+            self.doQuery(f"CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE ON {table} BEGIN "
+                f"INSERT INTO {fts} ({fts}, rowid, {names}) VALUES ('delete', old.rowid, {old}); "
+                f"INSERT INTO {fts} (rowid, {names}) VALUES (new.rowid, {new}); END;")
+
+            # index the existing rows
+            self.doQuery(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild');")
+
+
+    def dropSearchIndex(self, table: str):
+        """Drop the full-text index of table and its triggers"""
+
+        fts = f"{table}_fts"
+        with self.transaction("IMMEDIATE"):
+            for trigger in ("insert", "delete", "update"):
+                self.doQuery(f"DROP TRIGGER IF EXISTS {fts}_{trigger};")
+
+            self.doQuery(f"DROP TABLE IF EXISTS {fts};")
+
+
+    def search(self, table: str, text: str, columns: Sequence[str] = None, limit: int = 20,
+        offset: int = 0, prefix: bool = False, raw: bool = False, weights: Sequence[float] = None,
+        snippetTokens: int = 10, highlight: Tuple[str, str] = ("[", "]")) -> List[Any]:
+        """Search table's full-text index. Return its matching rows, best match first,
+        with the columns `rank` (bm25, lower is better) and `snippet` added.
+
+        text:
+            The words to find. Every word must be in the row.
+        columns:
+            The indexed columns to search. Defaults to all of them.
+        limit, offset:
+            The page of results to return.
+        prefix:
+            Whether the words match the start of longer words. e.g. "dat" matches "database"
+        raw:
+            Whether text is an FTS5 query, allowing OR, NOT, NEAR, "phrases", and prefix*.
+            Otherwise, each word is quoted so it's matched literally.
+        weights:
+            The bm25 weight of each indexed column, in the order of createSearchIndex.
+        snippetTokens:
+            The maximum number of words in snippet.
+        highlight:
+            The text before and after each matched word in snippet."""
+
+        fts = f"{table}_fts"
+
+        if raw:
+            match = text
 
         else:
-            self.cursor.executemany(query, vars)
+            # quoting stops punctuation from being read as FTS5 syntax
+            terms = ['"' + term.replace('"', '""') + '"' + ("*" if prefix else "") for term in text.split()]
+            if not terms:
+                return []
 
-        self.connection.commit()
-        return self.cursor.fetchall()
+            match = " ".join(terms)
+
+        if columns:
+            match = f"{{{' '.join(columns)}}} : ({match})"
+
+        rank = f"bm25({fts}{''.join(f', {weight}' for weight in weights or ())})"
+        query = (f"SELECT {table}.*, {rank} AS rank, snippet({fts}, -1, ?, ?, '...', ?) AS snippet "
+            f"FROM {fts} JOIN {table} ON {table}.rowid = {fts}.rowid "
+            f"WHERE {fts} MATCH ? ORDER BY rank LIMIT ? OFFSET ?;")
+
+        return self.doQuery(query, (highlight[0], highlight[1], snippetTokens, match, limit, offset))
 
 
     def _executeFromFile(self, path: str):
@@ -121,29 +2511,494 @@ class DBWriter:
 
         self.cursor.executescript(scriptLines)
         self.connection.commit()
+        self._releaseIdle()
 
 
     def toggleRow(self, targetState: bool = None):
         """
         Either set toggle cursor.row_factory from
         Row to None/None to Row, or set it to the target state.
-        
+
         targetState:
             True: row_factory = Row
             False: row_factory = None
         """
-        
+
         # if a target was passed
         if targetState:
-            self.cursor.row_factory = sql.Row
+            self._rowFactory = sql.Row
 
         elif targetState is False:  # I can't use falsy values since None is falsy
-            self.cursor.row_factory = None
+            self._rowFactory = None
 
         # if no target was passed: toggle
         # if on: toggle off
-        elif self.cutsor.row_factory:
-            self.cursor.row_factory = None
+        elif self._rowFactory:
+            self._rowFactory = None
 
         else: # if not on: toggle on
-            self.cursor.row_factory = sql.Row
\ No newline at end of file
+            self._rowFactory = sql.Row
+
+
+    def releaseConnection(self):
+        """Return the calling thread's connection to the pool.
+        Worker threads should call this when they're done with the database."""
+
+        # the pool rolls back uncommitted changes
+        self.flush()
+        self._local.cursor = None
+        self.pool.releaseThread()
+
+        if self.readPool is not None:
+            self._local.readCursor = None
+            self.readPool.releaseThread()
+
+
+    def close(self):
+        """Commit the calling thread's pending writes and close all of the connections in the pool.
+        In-memory databases are snapshotted first if snapshotOnClose is on."""
+
+        self.disableGroupCommit()
+        self.flush()
+        if self.checkpointer is not None:
+            self.checkpointer.stop()
+
+        if self.readPool is not None:
+            self.readPool.close()
+
+        if self.snapshotter is not None:
+            self.snapshotter.stop()
+
+        if self._anchor is not None and self.snapshotOnClose:
+            self.snapshot()
+
+        self.pool.close()
+
+        if self._anchor is not None:
+            self._anchor.close()
+
+
+class WriteBehind:
+    """
+    Queues writes to a DBWriter and does them on one background thread,
+    so producers don't wait for SQLite. Queued writes are grouped into transactions
+    and consecutive runs of the same statement into executemany calls.
+    Producers block when the queue is full.
+
+    ATTRIBUTES
+    db: DBWriter
+        The database to write to.
+    batchSize: int
+        The maximum number of queued writes per transaction.
+    closed: bool property
+        Whether .close() has been called.
+    _queue: queue.Queue
+        The pending (query, vars, many, future) writes.
+    _thread: threading.Thread
+        The writer thread.
+    _closed: bool
+        Whether .close() has been called.
+    """
+
+    # ATTRIBUTES
+    _stop = object()  # queued by .close() to stop the writer thread
+
+
+    def __init__(self, db: 'DBWriter', maxQueue: int = 10000, batchSize: int = 500):
+        """
+        ARGUMENTS
+        db:
+            The database to write to.
+        maxQueue:
+            The maximum number of pending writes before .submit() blocks.
+        batchSize:
+            The maximum number of queued writes per transaction.
+        """
+
+        self.db = db
+        self.batchSize = batchSize
+        self._queue = Queue(maxQueue)
+        self._closed = False
+
+        self._thread = threading.Thread(target = self._run, name = "WriteBehind", daemon = True)
+        self._thread.start()
+
+        # the writer is a daemon thread, so flush the queue on exit
+        atexit.register(self.close)
+
+
+    def submit(self, query: str, vars: tuple = (), many: bool = False,
+        timeout: float = None) -> Future:
+        """Queue a write. Return a Future that's resolved with None
+        once it's committed or with the exception it raised.
+        Block while the queue is full. Raise queue.Full if it's still full after timeout."""
+
+        if self._closed:
+            raise RuntimeError("Cannot submit to a closed WriteBehind")
+
+        future = Future()
+        self._queue.put((query, vars, many, future), timeout = timeout)
+        return future
+
+
+    def _run(self):
+        """Write the queued writes until stopped"""
+
+        stopping = False
+        while not stopping:
+            # wait for a write then take whatever else is already queued
+            batch = [self._queue.get()]
+            while len(batch) < self.batchSize and batch[-1] is not self._stop:
+                try:
+                    batch.append(self._queue.get_nowait())
+
+                except Empty:
+                    break
+
+            stopping = batch[-1] is self._stop
+            writes = [write for write in batch if write is not self._stop
+                # cancelled futures are skipped
+                and write[3].set_running_or_notify_cancel()]
+
+            if writes:
+                self._write(writes)
+
+            for _ in batch:
+                self._queue.task_done()
+
+        self.db.releaseConnection()
+
+
+    def _write(self, writes: List[tuple]):
+        """Do the writes in one transaction.
+        If it fails, do them one at a time to find the failing writes."""
+
+        try:
+            with self.db.transaction("IMMEDIATE") as cursor:
+                # group runs of the same single statement into one executemany
+                start = 0
+                while start < len(writes):
+                    query, vars, many, _ = writes[start]
+                    end = start + 1
+                    if many:
+                        cursor.executemany(query, vars)
+
+                    else:
+                        while end < len(writes) and writes[end][0] == query and not writes[end][2]:
+                            end += 1
+
+                        if end - start == 1:
+                            cursor.execute(query, vars)
+
+                        else:
+                            cursor.executemany(query, [write[1] for write in writes[start:end]])
+
+                    start = end
+
+        except Exception:
+            # single writes already have their error
+            if len(writes) == 1:
+                writes[0][3].set_exception(sys.exc_info()[1])
+                return
+
+            for write in writes:
+                self._write([write])
+
+        else:
+            for write in writes:
+                write[3].set_result(None)
+
+
+    def flush(self):
+        """Wait until every queued write has been done"""
+
+        self._queue.join()
+
+
+    def close(self, wait: bool = True):
+        """Stop accepting writes and stop the writer thread once the queue is empty.
+
+        wait:
+            Whether to wait for the queued writes to be done."""
+
+        if self._closed:
+            return
+
+        self._closed = True
+        atexit.unregister(self.close)
+        self._queue.put(self._stop)
+
+        if wait:
+            self._thread.join()
+
+
+    def __enter__(self) -> 'WriteBehind':
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+    @property
+    def closed(self) -> bool:
+        """Get whether .close() has been called"""
+
+        return self._closed
+
+
+class ShardedDBWriter:
+    """
+    Spreads rows over several database files (shards) by a shard key
+    so that each file has its own writer lock.
+    Each shard is used by its own thread, so the shards are written and queried in parallel.
+
+    ATTRIBUTES
+    shards: list of DBWriter
+        The shards. The shard of a key is shardOf(key, len(shards)).
+    _executors: list of concurrent.futures.ThreadPoolExecutor
+        The thread of each shard.
+    """
+
+    def __init__(self, name: str, shardCount: int = 4, **kwargs):
+        """
+        ARGUMENTS
+        name:
+            The name describing what the database contains.
+            Shard i is the DBWriter called `name`_shard`i`.
+        shardCount:
+            The number of shards. Must stay the same for the rows to be found again.
+        kwargs:
+            The keyword arguments of each DBWriter.
+        """
+
+        if shardCount < 1:
+            raise ValueError("shardCount must be at least 1")
+
+        self.shards = [DBWriter(f"{name}_shard{i}", **kwargs) for i in range(shardCount)]
+        self._executors = [ThreadPoolExecutor(1, thread_name_prefix = f"{name}_shard{i}")
+            for i in range(shardCount)]
+
+
+    @staticmethod
+    def shardOf(key: Any, shardCount: int) -> int:
+        """Get the index of the shard for key.
+        Stable between processes, unlike hash().
+        Keys that SQLite treats as equal go to the same shard. e.g. 1, 1.0, True, and numpy.int64(1)."""
+
+        # SQLite compares numbers by value whatever their type
+        if isinstance(key, Integral):
+            key = int(key)
+
+        elif isinstance(key, Real):
+            key = float(key)
+            if key.is_integer():
+                key = int(key)
+
+        return zlib.crc32(repr(key).encode()) % shardCount
+
+
+    def shardFor(self, key: Any) -> 'DBWriter':
+        """Get the shard for key"""
+
+        return self.shards[self.shardOf(key, len(self.shards))]
+
+
+    def _onEach(self, method: str, *args) -> List[Any]:
+        """Call a DBWriter method on every shard in parallel. Return the results in shard order."""
+
+        futures = [executor.submit(getattr(shard, method), *args)
+            for shard, executor in zip(self.shards, self._executors)]
+        return [future.result() for future in futures]
+
+
+    def broadcast(self, query: str, vars: tuple = (), many: bool = False) -> List[List[Any]]:
+        """Do a query on every shard. Used for creating tables and indexes.
+        Return each shard's results."""
+
+        return self._onEach("doQuery", query, vars, many)
+
+
+    def doQuery(self, key: Any, query: str, vars: tuple = (), many: bool = False) -> List[Any]:
+        """Do a query on the shard for key"""
+
+        index = self.shardOf(key, len(self.shards))
+        return self._executors[index].submit(self.shards[index].doQuery, query, vars, many).result()
+
+
+    def insert(self, query: str, rows: Iterable[Sequence], key: Union[int, str, Callable] = 0) -> int:
+        """Write rows to their shards with one executemany per shard. Return the number of rows.
+
+        query:
+            The statement to run for each row. e.g. INSERT INTO t VALUES (?, ?)
+        key:
+            The index or name of the shard key in each row
+            or a function that takes a row and returns its shard key."""
+
+        getKey = key if callable(key) else itemgetter(key)
+        shardCount = len(self.shards)
+
+        grouped = [[] for _ in range(shardCount)]
+        for row in rows:
+            grouped[self.shardOf(getKey(row), shardCount)].append(row)
+
+        futures = [executor.submit(self._insertShard, shard, query, shardRows)
+            for shard, executor, shardRows in zip(self.shards, self._executors, grouped) if shardRows]
+        for future in futures:
+            future.result()
+
+        return sum(len(shardRows) for shardRows in grouped)
+
+
+    @staticmethod
+    def _insertShard(shard: 'DBWriter', query: str, rows: List[Sequence]):
+        """Write one shard's rows in one transaction"""
+
+        with shard.transaction("IMMEDIATE") as cursor:
+            cursor.executemany(query, rows)
+
+
+    def query(self, query: str, vars: tuple = (), orderBy: Union[int, str, Callable] = None,
+        reverse: bool = False, limit: int = None) -> List[Any]:
+        """Do a read on every shard and merge the results.
+
+        orderBy:
+            The index or name of the column to order by
+            or a function that takes a row and returns what to order by.
+            None keeps the results in shard order.
+        reverse:
+            Whether to order descending.
+        limit:
+            The maximum number of rows to return.
+            Add the same LIMIT (and ORDER BY) to query so each shard returns at most limit rows."""
+
+        results = self._onEach("doQuery", query, vars)
+
+        if orderBy is None:
+            merged = chain.from_iterable(results)
+
+        else:
+            getKey = orderBy if callable(orderBy) else itemgetter(orderBy)
+
+            # sorting is linear when the shard already ordered its rows
+            for rows in results:
+                rows.sort(key = getKey, reverse = reverse)
+
+            merged = heapq.merge(*results, key = getKey, reverse = reverse)
+
+        return list(islice(merged, limit))
+
+
+    def close(self):
+        """Close every shard and stop their threads"""
+
+        # each shard's connection belongs to its thread
+        self._onEach("close")
+        for executor in self._executors:
+            executor.shutdown()
+
+
+class AsyncDBWriter:
+    """
+    Runs a DBWriter's queries on dedicated threads so that coroutines don't block the event loop.
+    Writes run on one thread and reads are spread over the reader threads.
+    Each thread has its own connection, so reads run concurrently.
+
+    ATTRIBUTES
+    db: DBWriter
+        The database to query. Its pool (or readPool in WAL mode)
+        needs a connection for each thread.
+    _writer: concurrent.futures.ThreadPoolExecutor
+        The thread that writes.
+    _readers: list of concurrent.futures.ThreadPoolExecutor
+        The threads that read.
+    _nextReader: int
+        The index of the reader thread to use next.
+    """
+
+    def __init__(self, db: 'DBWriter', readers: int = 2):
+        """
+        ARGUMENTS
+        db:
+            The database to query.
+        readers:
+            The number of threads that read. 0 reads on the writer thread.
+        """
+
+        self.db = db
+        self._writer = ThreadPoolExecutor(1, thread_name_prefix = "AsyncDBWriter-writer")
+        self._readers = [ThreadPoolExecutor(1, thread_name_prefix = f"AsyncDBWriter-reader{i}")
+            for i in range(readers)]
+        self._nextReader = 0
+
+
+    def _executorFor(self, query: str, many: bool = False) -> ThreadPoolExecutor:
+        """Get the thread to run query on"""
+
+        if many or not self._readers or not _isRead(query):
+            return self._writer
+
+        # round robin
+        self._nextReader = (self._nextReader + 1) % len(self._readers)
+        return self._readers[self._nextReader]
+
+
+    async def _runOn(self, executor: ThreadPoolExecutor, func: Callable, *args) -> Any:
+        """Await func(*args) on executor's thread"""
+
+        return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+
+
+    async def query(self, query: str, vars: tuple = (), many: bool = False) -> List[Any]:
+        """Await DBWriter.doQuery"""
+
+        return await self._runOn(self._executorFor(query, many), self.db.doQuery, query, vars, many)
+
+
+    async def run(self, func: Callable, *args) -> Any:
+        """Await func(*args) on the writer thread.
+        Use for work that needs several statements, like a DBWriter.transaction block."""
+
+        return await self._runOn(self._writer, func, *args)
+
+
+    async def stream(self, query: str, vars: tuple = (), batchSize: int = 1000,
+        rowType: str = None) -> AsyncIterator[Any]:
+        """Async generator for the rows of DBWriter.stream.
+        Each batch is fetched on the query's thread while the event loop keeps running.
+        Call its .aclose() (or use contextlib.aclosing) when stopping early
+        so the cursor is closed straight away."""
+
+        executor = self._executorFor(query)
+        results = await self._runOn(executor, self.db.stream, query, vars, batchSize, rowType)
+        batches = results.batches()
+        try:
+            while True:
+                # StopIteration can't be passed through a future
+                batch = await self._runOn(executor, next, batches, None)
+                if batch is None:
+                    break
+
+                for row in batch:
+                    yield row
+
+        # the cursor belongs to executor's thread
+        finally:
+            await self._runOn(executor, results.close)
+
+
+    async def close(self):
+        """Return each thread's connection to the pool and stop the threads.
+        The DBWriter isn't closed."""
+
+        for executor in (self._writer, *self._readers):
+            await self._runOn(executor, self.db.releaseConnection)
+            executor.shutdown(wait = False)
+
+
+    async def __aenter__(self) -> 'AsyncDBWriter':
+        return self
+
+
+    async def __aexit__(self, *exc_info):
+        await self.close()